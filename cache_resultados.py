@@ -0,0 +1,133 @@
+import os
+import json
+import pickle
+import hashlib
+import tempfile
+
+# Incrementar quando a lógica de conciliação mudar, invalidando os resultados antigos
+VERSAO_CACHE = 9
+
+PASTA_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
+
+
+def configuracao_motor(motor_soma):
+    """Configuração do motor de somas para a chave do cache (o padrão quando None)."""
+    if motor_soma is None:
+        # Import local: reconciliation usa este módulo (via incremental)
+        from reconciliation import MotorSomaSubconjuntos
+        motor_soma = MotorSomaSubconjuntos()
+    configuracao = getattr(motor_soma, "configuracao", None)
+    if configuracao is not None:
+        configuracao = configuracao()
+    else:
+        configuracao = {k: v for k, v in vars(motor_soma).items() if k != "buscas_interrompidas"}
+    return {"classe": type(motor_soma).__name__, **configuracao}
+
+
+def chave_conciliacao(conteudos, mapeamento, tipo_relatorio, filtro_conta=None,
+                      dialeto=None, motor_soma=None, opcoes=None):
+    """
+    Chave do resultado de uma conciliação: hash do conteúdo dos arquivos (na ordem
+    recebida), do mapeamento de colunas, do formato do relatório, do filtro de conta,
+    do dialeto do CSV, da configuração do motor de somas e de opções adicionais
+    (ex.: execução paralela, mapa de contas).
+    conteudos: lista de bytes (OFX e relatório) ou de hashes SHA-256 já calculados.
+    """
+    h = hashlib.sha256()
+    for conteudo in conteudos:
+        if isinstance(conteudo, bytes):
+            conteudo = hashlib.sha256(conteudo).hexdigest()
+        h.update(conteudo.encode())
+    parametros = {
+        "versao": VERSAO_CACHE,
+        "mapeamento": mapeamento,
+        "tipo_relatorio": tipo_relatorio,
+        "filtro_conta": filtro_conta,
+        "dialeto": dialeto,
+        "motor": configuracao_motor(motor_soma),
+        "opcoes": opcoes or {},
+    }
+    h.update(json.dumps(parametros, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+class CacheResultados:
+    """
+    Cache em disco dos resultados de conciliação (um arquivo pickle por chave).
+    Cada leitura atualiza a data de modificação do arquivo; ao gravar, os menos
+    usados recentemente são removidos até respeitar o número máximo de entradas
+    e o tamanho máximo da pasta.
+    """
+
+    def __init__(self, pasta=PASTA_CACHE, max_entradas=100, tamanho_maximo=500 * 1024 * 1024):
+        self.pasta = pasta
+        self.max_entradas = max_entradas
+        self.tamanho_maximo = tamanho_maximo
+        os.makedirs(self.pasta, exist_ok=True)
+
+    def _caminho(self, chave):
+        return os.path.join(self.pasta, f"{chave}.pkl")
+
+    def obter(self, chave):
+        """Retorna o resultado guardado para a chave, ou None."""
+        caminho = self._caminho(chave)
+        try:
+            with open(caminho, "rb") as f:
+                resultado = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # Arquivo corrompido ou de uma versão incompatível: descartar
+            self._remover(caminho)
+            return None
+        # Marcar como usado recentemente (LRU pela data de modificação)
+        try:
+            os.utime(caminho)
+        except OSError:
+            pass
+        return resultado
+
+    def salvar(self, chave, resultado):
+        """Grava o resultado (de forma atômica) e aplica o limite de entradas e tamanho."""
+        descritor, temporario = tempfile.mkstemp(dir=self.pasta, suffix=".tmp")
+        try:
+            with os.fdopen(descritor, "wb") as f:
+                pickle.dump(resultado, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporario, self._caminho(chave))
+        except Exception:
+            self._remover(temporario)
+            raise
+        self._limpar()
+
+    def limpar_tudo(self):
+        """Remove todas as entradas do cache."""
+        for nome in os.listdir(self.pasta):
+            if nome.endswith(".pkl"):
+                self._remover(os.path.join(self.pasta, nome))
+
+    def _limpar(self):
+        entradas = []
+        for nome in os.listdir(self.pasta):
+            if not nome.endswith(".pkl"):
+                continue
+            caminho = os.path.join(self.pasta, nome)
+            try:
+                info = os.stat(caminho)
+            except OSError:
+                continue
+            entradas.append((info.st_mtime, info.st_size, caminho))
+
+        # Mais recentes primeiro; o que exceder os limites é removido
+        entradas.sort(reverse=True)
+        tamanho_total = 0
+        for posicao, (_, tamanho, caminho) in enumerate(entradas):
+            tamanho_total += tamanho
+            if posicao >= self.max_entradas or (posicao > 0 and tamanho_total > self.tamanho_maximo):
+                self._remover(caminho)
+
+    @staticmethod
+    def _remover(caminho):
+        try:
+            os.remove(caminho)
+        except OSError:
+            pass
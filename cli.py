@@ -0,0 +1,309 @@
+"""
+Conciliação em lote, sem interface:
+
+    python cli.py --ofx extrato.ofx --relatorio relatorio.csv --perfil profiles/Ricco.json --saida resultados/
+
+Vários OFX da mesma conta (ACCTID) são unidos sem transações duplicadas. Com contas
+diferentes, o modo em lote concilia todas de uma vez (o relatório é lido uma única vez e
+dividido pela coluna de conta; cada OFX é pareado pela conta ACCTID ou pelo mapa em --mapa-contas):
+
+    python cli.py --ofx contas/*.ofx --relatorio relatorio.csv --perfil profiles/Ricco.json --mapa-contas mapa.json
+
+Usa o mesmo perfil salvo pela interface (mapeamento, tipo de relatório e dialeto do CSV)
+e grava os resultados em CSV (separador ';', UTF-8 com BOM) mais as estatísticas em JSON.
+"""
+import os
+import sys
+import json
+import argparse
+from datetime import date
+from data_loader import ler_ofx, identificar_conta_ofx, identificar_contas_ofx, mesclar_ofx, carregar_relatorio_em_blocos
+from reconciliation import conciliar, conciliar_contas
+from incremental import EstadoIncremental
+from historico import HistoricoConciliacao
+from transacoes import criar_transacoes
+from moeda import formatar_centavos
+from cache_resultados import CacheResultados, PASTA_CACHE, chave_conciliacao
+
+
+def carregar_perfil(caminho):
+    """Lê um perfil salvo em profiles/*.json"""
+    with open(caminho, "r") as f:
+        perfil = json.load(f)
+    if "mapeamento" not in perfil or "tipo_relatorio" not in perfil:
+        raise Exception(f"Perfil inválido: {caminho}")
+    return perfil
+
+
+def ler_feriados(valor):
+    """Feriados de --feriados: lista 'AAAA-MM-DD,AAAA-MM-DD' ou arquivo com uma data por linha."""
+    if not valor:
+        return []
+    if os.path.exists(valor):
+        with open(valor, "r") as f:
+            valor = f.read().replace("\n", ",")
+    try:
+        return sorted({date.fromisoformat(d.strip()) for d in valor.split(",") if d.strip()})
+    except ValueError as e:
+        raise Exception(f"Feriado inválido em --feriados: {e}")
+
+
+def carregar_relatorio(caminho_relatorio, perfil, conta=None):
+    """Lê e converte o relatório com o mapeamento e o dialeto do perfil."""
+    with open(caminho_relatorio, "rb") as arquivo_rel:
+        return carregar_relatorio_em_blocos(
+            arquivo_rel,
+            os.path.basename(caminho_relatorio),
+            perfil["mapeamento"],
+            perfil["tipo_relatorio"],
+            conta,
+            dialeto=perfil.get("dialeto")
+        )
+
+
+def _chave(caminhos, perfil, conta=None, opcoes=None):
+    """Chave do cache de resultados para estes arquivos e este perfil."""
+    conteudos = []
+    for caminho in caminhos:
+        with open(caminho, "rb") as f:
+            conteudos.append(f.read())
+    return chave_conciliacao(
+        conteudos, perfil["mapeamento"], perfil["tipo_relatorio"], conta,
+        perfil.get("dialeto"), opcoes=opcoes
+    )
+
+
+def executar_conciliacao(caminhos_ofx, caminho_relatorio, perfil, conta=None, processos=None, cache=None,
+                         caminho_estado=None, opcoes=None):
+    """
+    Carrega os arquivos e executa a conciliação. Retorna o ResultadoConciliacao.
+    caminhos_ofx: um OFX ou uma lista de OFX da mesma conta, unidos sem transações
+    duplicadas (mesclar_ofx).
+    Com um CacheResultados, reaproveita o resultado de uma execução idêntica anterior.
+    Com caminho_estado, concilia em modo incremental (só dias novos ou alterados) e
+    o cache de resultados não é usado: o estado precisa ser gravado a cada execução.
+    opcoes: parâmetros adicionais de conciliar (ex.: janela_dias, feriados, usar_descricoes).
+    """
+    opcoes = opcoes or {}
+    if caminho_estado:
+        cache = None
+    if isinstance(caminhos_ofx, str):
+        caminhos_ofx = [caminhos_ofx]
+    if cache is not None:
+        chave = _chave(list(caminhos_ofx) + [caminho_relatorio], perfil, conta,
+                       {"paralelo": bool(processos and processos > 1), **opcoes})
+        resultado = cache.obter(chave)
+        if resultado is not None:
+            return resultado
+    
+    listas = []
+    for caminho in caminhos_ofx:
+        with open(caminho, "rb") as arquivo_ofx:
+            listas.append(ler_ofx(arquivo_ofx))
+    if len(listas) > 1:
+        trans_ofx, duplicadas = mesclar_ofx(listas)
+        if duplicadas:
+            print(f"{len(listas)} extratos unidos, {duplicadas} transação(ões) repetida(s) descartada(s)")
+    else:
+        trans_ofx = listas[0]
+    df_trans_rel = carregar_relatorio(caminho_relatorio, perfil, conta)
+    estado = EstadoIncremental(caminho_estado) if caminho_estado else None
+    resultado = conciliar(trans_ofx, criar_transacoes(df_trans_rel), df_relatorio=df_trans_rel,
+                          processos=processos, estado=estado, **opcoes)
+    if cache is not None:
+        cache.salvar(chave, resultado)
+    return resultado
+
+
+def executar_lote(caminhos_ofx, caminho_relatorio, perfil, mapa_contas=None, processos=None, cache=None,
+                  pasta_estado=None, opcoes=None):
+    """
+    Concilia vários extratos contra um único relatório, lido uma vez.
+    Cada extrato é identificado pelo ACCTID (ou pelo nome do arquivo, se não houver);
+    um arquivo com várias contas contribui com um extrato por conta, e extratos da
+    mesma conta são unidos sem transações duplicadas (mesclar_ofx).
+    Retorna o ResultadoLote.
+    Com pasta_estado, cada conta é conciliada em modo incremental, sem o cache de resultados.
+    opcoes: parâmetros adicionais de conciliar (ex.: janela_dias, feriados, usar_descricoes).
+    """
+    opcoes = opcoes or {}
+    if pasta_estado:
+        cache = None
+    if cache is not None:
+        chave = _chave(list(caminhos_ofx) + [caminho_relatorio], perfil,
+                       opcoes={"lote": True, "mapa_contas": mapa_contas, **opcoes})
+        resultado = cache.obter(chave)
+        if resultado is not None:
+            return resultado
+    
+    arquivos_por_conta = {}
+    for caminho in caminhos_ofx:
+        with open(caminho, "rb") as arquivo_ofx:
+            contas = identificar_contas_ofx(arquivo_ofx)
+            if len(contas) > 1:
+                for conta in dict.fromkeys(contas):
+                    arquivos_por_conta.setdefault(conta, []).append(ler_ofx(arquivo_ofx, conta))
+                continue
+            conta = contas[0] or os.path.splitext(os.path.basename(caminho))[0]
+            arquivos_por_conta.setdefault(conta, []).append(ler_ofx(arquivo_ofx))
+    extratos = {}
+    for conta, listas in arquivos_por_conta.items():
+        extratos[conta], duplicadas = mesclar_ofx(listas)
+        if duplicadas:
+            print(f"Conta {conta}: {len(listas)} extratos unidos, {duplicadas} transação(ões) repetida(s) descartada(s)")
+    df_trans_rel = carregar_relatorio(caminho_relatorio, perfil)
+    resultado = conciliar_contas(extratos, df_trans_rel, mapa_contas, processos=processos,
+                                 pasta_estado=pasta_estado, **opcoes)
+    if cache is not None:
+        cache.salvar(chave, resultado)
+    return resultado
+
+
+def salvar_resultado(resultado, pasta, prefixo="conciliacao"):
+    """Grava detalhes, agregado, movimentação diária e estatísticas em `pasta`."""
+    os.makedirs(pasta, exist_ok=True)
+    arquivos = {
+        "detalhes": resultado.detalhes,
+        "agregado": resultado.agregado,
+        "diario": resultado.diario,
+    }
+    caminhos = []
+    for nome, df in arquivos.items():
+        caminho = os.path.join(pasta, f"{prefixo}_{nome}.csv")
+        df.to_csv(caminho, index=False, sep=';', encoding='utf-8-sig')
+        caminhos.append(caminho)
+
+    caminho = os.path.join(pasta, f"{prefixo}_estatisticas.json")
+    with open(caminho, "w", encoding="utf-8") as f:
+        json.dump(resultado.estatisticas, f, ensure_ascii=False, indent=2)
+    caminhos.append(caminho)
+    return caminhos
+
+
+def imprimir_resumo(estatisticas):
+    print(f"Taxa de sucesso: {estatisticas['taxa_conciliacao']:.1f}%")
+    print(f"{estatisticas['conciliados']} transações conciliadas | {estatisticas['nao_conciliados']} não conciliadas")
+    if estatisticas.get("sugeridos"):
+        print(f"{estatisticas['sugeridos']} sugestões pela descrição para revisar")
+    print(f"Dias conciliados: {estatisticas['dias_conciliados']}/{estatisticas['total_dias']}")
+    if estatisticas.get("dias_reaproveitados"):
+        print(f"Modo incremental: {estatisticas['dias_processados']} dia(s) processado(s), "
+              f"{estatisticas['dias_reaproveitados']} reaproveitado(s)")
+    print(f"Total extrato: {formatar_centavos(estatisticas['total_extrato'])} | "
+          f"Total relatório: {formatar_centavos(estatisticas['total_relatorio'])} | "
+          f"Diferença: {formatar_centavos(estatisticas['diferenca_total'])}")
+    if estatisticas["dias_problema"]:
+        print(f"Dias com diferenças: {', '.join(estatisticas['dias_problema'])}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Conciliação bancária automática em lote")
+    parser.add_argument("--ofx", required=True, nargs="+",
+                        help="Arquivo(s) OFX do extrato bancário; extratos da mesma conta são unidos, "
+                             "contas diferentes (ACCTID) ativam o modo em lote")
+    parser.add_argument("--relatorio", required=True, help="Relatório ERP/Financeiro (CSV ou Excel)")
+    parser.add_argument("--perfil", required=True, help="Perfil de mapeamento salvo (profiles/*.json)")
+    parser.add_argument("--conta", default=None, help="Filtrar o relatório por conta (opcional)")
+    parser.add_argument("--lote", action="store_true",
+                        help="Modo em lote (várias contas) mesmo com um único OFX")
+    parser.add_argument("--mapa-contas", default=None,
+                        help="JSON {conta do OFX (ACCTID): conta do relatório} para o modo em lote")
+    parser.add_argument("--processos", type=int, default=1,
+                        help="Processos para conciliar os dias em paralelo (padrão: 1)")
+    parser.add_argument("--janela", type=int, default=0,
+                        help="Tolerância de ±N dias úteis entre a data do extrato e a do relatório (padrão: 0)")
+    parser.add_argument("--feriados", default=None,
+                        help="Feriados que não contam como dia útil na janela: datas AAAA-MM-DD separadas "
+                             "por vírgula ou um arquivo com uma data por linha")
+    parser.add_argument("--descricoes", action="store_true",
+                        help="Usar as descrições para desempatar valores iguais e sugerir pares "
+                             "de valor próximo e descrição parecida (status 'Sugerido (Descrição)')")
+    parser.add_argument("--liquidacao", type=int, default=0,
+                        help="Procura créditos do extrato que liquidam vários recebíveis do relatório "
+                             "lançados até N dias úteis antes (cartões, gateways); padrão: 0 (desligado)")
+    parser.add_argument("--filtro-liquidacao", default=None,
+                        help="Palavras separadas por vírgula (ex.: cielo,rede) que a descrição ou a conta "
+                             "do recebível precisa ter para entrar em uma liquidação")
+    parser.add_argument("--atribuicao-otima", action="store_true",
+                        help="Resolver cada dia por fases (todos os exatos antes das somas, somas sem "
+                             "conflito) em vez de seguir a ordem do extrato")
+    parser.add_argument("--estado", default=None,
+                        help="Modo incremental: arquivo de estado (.json) ou, no modo em lote, "
+                             "pasta com um estado por conta; só dias novos ou alterados são conciliados "
+                             "(o cache de resultados não é usado)")
+    parser.add_argument("--historico", default=None,
+                        help="Banco SQLite onde gravar o resultado para consultas futuras (ex.: historico.db)")
+    parser.add_argument("--cache", default=PASTA_CACHE,
+                        help="Pasta do cache de resultados (padrão: cache/ ao lado do programa)")
+    parser.add_argument("--sem-cache", action="store_true",
+                        help="Sempre reconciliar, sem ler nem gravar o cache de resultados")
+    parser.add_argument("--saida", default="resultados", help="Pasta onde os resultados serão gravados")
+    parser.add_argument("--prefixo", default=None, help="Prefixo dos arquivos gerados (padrão: nome do OFX)")
+    args = parser.parse_args(argv)
+
+    try:
+        # Modo em lote só com contas diferentes: vários OFX da mesma conta (ex.: períodos
+        # sobrepostos) são unidos e conciliados juntos, respeitando --conta
+        contas_ofx = set()
+        for caminho in args.ofx:
+            with open(caminho, "rb") as arquivo_ofx:
+                contas_ofx.update(identificar_contas_ofx(arquivo_ofx))
+        lote = args.lote or len(contas_ofx - {""}) > 1
+        if lote and args.conta:
+            print("Aviso: --conta é ignorado no modo em lote (cada extrato é pareado com a sua conta)",
+                  file=sys.stderr)
+        perfil = carregar_perfil(args.perfil)
+        opcoes = {"janela_dias": args.janela, "feriados": ler_feriados(args.feriados),
+                  "usar_descricoes": args.descricoes, "atribuicao_otima": args.atribuicao_otima,
+                  "janela_liquidacao": args.liquidacao,
+                  "filtro_liquidacao": (args.filtro_liquidacao or "").split(",")}
+        cache = None if args.sem_cache else CacheResultados(args.cache)
+        if lote:
+            mapa_contas = None
+            if args.mapa_contas:
+                with open(args.mapa_contas, "r") as f:
+                    mapa_contas = json.load(f)
+            resultado = executar_lote(args.ofx, args.relatorio, perfil, mapa_contas, args.processos, cache,
+                                      args.estado, opcoes)
+        else:
+            resultado = executar_conciliacao(args.ofx, args.relatorio, perfil, args.conta, args.processos,
+                                             cache, args.estado, opcoes)
+
+        if args.historico:
+            with HistoricoConciliacao(args.historico) as historico:
+                if lote:
+                    historico.registrar_lote(resultado, arquivo_relatorio=args.relatorio)
+                else:
+                    # Sempre pela conta do extrato (ACCTID), com ou sem --conta, para que a
+                    # execução mais recente de cada dia substitua a anterior no histórico
+                    with open(args.ofx[0], "rb") as arquivo_ofx:
+                        conta = identificar_conta_ofx(arquivo_ofx)
+                    historico.registrar(resultado, conta or os.path.splitext(os.path.basename(args.ofx[0]))[0],
+                                        arquivo_ofx=", ".join(args.ofx), arquivo_relatorio=args.relatorio)
+    except Exception as e:
+        print(f"Erro durante o processamento: {e}", file=sys.stderr)
+        return 1
+
+    prefixo = args.prefixo or ("lote" if lote else os.path.splitext(os.path.basename(args.ofx[0]))[0])
+    for caminho in salvar_resultado(resultado, args.saida, prefixo):
+        print(f"Gravado: {caminho}")
+
+    if not lote:
+        imprimir_resumo(resultado.estatisticas)
+        return 0
+
+    for conta_ofx, estatisticas in resultado.estatisticas.items():
+        print(f"\n== Conta {conta_ofx} (relatório: {resultado.pares[conta_ofx]}) ==")
+        imprimir_resumo(estatisticas)
+    for conta_ofx in resultado.extratos_sem_conta:
+        print(f"\nAviso: extrato da conta {conta_ofx} sem conta correspondente no relatório", file=sys.stderr)
+    if resultado.contas_sem_extrato:
+        print(f"Aviso: contas do relatório sem extrato: {', '.join(resultado.contas_sem_extrato)}", file=sys.stderr)
+    if not resultado.por_conta:
+        print("Erro: nenhum extrato foi pareado com uma conta do relatório (veja --mapa-contas)", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,10 +2,105 @@ import pandas as pd
 import ofxparse
 from io import BytesIO
 import re
+import csv
+from collections import Counter
 from datetime import datetime
+from functools import lru_cache
+from moeda import para_centavos, serie_para_centavos
+from ofx_reader import iterar_transacoes_ofx, extrair_conta_ofx, listar_contas_ofx
+from transacoes import Transacao, criar_transacoes
 
-def ler_ofx(arquivo_ofx):
-    """Lê um arquivo OFX e retorna as transações em formato padronizado."""
+def ler_ofx(arquivo_ofx, conta=None):
+    """
+    Lê um arquivo OFX e retorna as transações em formato padronizado.
+    Usa o leitor direto dos blocos STMTTRN (ofx_reader), que decodifica o arquivo
+    uma vez com o charset do cabeçalho e mantém FITID e acentos; arquivos que ele
+    não reconhece seguem para o ofxparse.
+    Em arquivos com extratos de várias contas, conta (ACCTID) escolhe o extrato;
+    sem ela, só o primeiro é lido (ver identificar_contas_ofx).
+    """
+    try:
+        arquivo_ofx.seek(0)
+        conteudo = arquivo_ofx.read()
+    except Exception as e:
+        raise Exception(f"Erro ao processar arquivo OFX: {str(e)}")
+    
+    if conta is not None:
+        try:
+            return list(iterar_transacoes_ofx(conteudo, conta))
+        except Exception as e:
+            raise Exception(f"Erro ao processar arquivo OFX: {str(e)}")
+    
+    try:
+        contas = listar_contas_ofx(conteudo)
+        if len(contas) > 1:
+            print(f"Aviso: o OFX tem extratos de {len(contas)} contas; lido apenas o da conta {contas[0]}")
+        transacoes = list(iterar_transacoes_ofx(conteudo))
+        if transacoes:
+            return transacoes
+    except Exception:
+        pass
+    
+    return _ler_ofx_ofxparse(arquivo_ofx)
+
+def _chave_duplicidade_ofx(transacao):
+    """
+    Chave que identifica a mesma transação em extratos diferentes: o FITID (com data
+    e valor, pois alguns bancos repetem FITIDs genéricos) ou, sem FITID, a data, o
+    valor e a descrição.
+    """
+    data = transacao["data"].date() if transacao["data"] else None
+    if transacao.get("fitid"):
+        return ("fitid", transacao["fitid"], data, transacao["centavos"])
+    return ("hash", data, transacao["centavos"], transacao.get("descricao") or "")
+
+def mesclar_ofx(listas_transacoes):
+    """
+    Junta as transações de vários OFX da mesma conta (ex.: extratos com períodos
+    sobrepostos) em uma única lista sem duplicidades, ordenada por data.
+    Uma transação repetida dentro do mesmo arquivo continua repetida; entre arquivos,
+    cada chave aparece o máximo de vezes em que aparece em um único arquivo.
+    Os IDs são renumerados pela posição na lista final.
+    Retorna (transações, quantidade de duplicadas descartadas).
+    """
+    mescladas = []
+    vistas = Counter()
+    descartadas = 0
+    for transacoes in listas_transacoes:
+        no_arquivo = Counter()
+        for transacao in transacoes:
+            chave = _chave_duplicidade_ofx(transacao)
+            no_arquivo[chave] += 1
+            if no_arquivo[chave] > vistas[chave]:
+                vistas[chave] += 1
+                mescladas.append(transacao)
+            else:
+                descartadas += 1
+    
+    # Ordenação estável: a ordem original é mantida dentro do mesmo dia
+    mescladas.sort(key=lambda t: (t["data"] is None, t["data"] or datetime.min))
+    for posicao, transacao in enumerate(mescladas):
+        transacao["id"] = posicao
+    return mescladas, descartadas
+
+def identificar_conta_ofx(arquivo_ofx):
+    """Retorna a conta (ACCTID) do primeiro extrato do arquivo OFX, ou '' se não houver."""
+    try:
+        arquivo_ofx.seek(0)
+        return extrair_conta_ofx(arquivo_ofx.read())
+    except Exception as e:
+        raise Exception(f"Erro ao processar arquivo OFX: {str(e)}")
+
+def identificar_contas_ofx(arquivo_ofx):
+    """Retorna a conta (ACCTID) de cada extrato do arquivo OFX, na ordem do arquivo."""
+    try:
+        arquivo_ofx.seek(0)
+        return listar_contas_ofx(arquivo_ofx.read())
+    except Exception as e:
+        raise Exception(f"Erro ao processar arquivo OFX: {str(e)}")
+
+def _ler_ofx_ofxparse(arquivo_ofx):
+    """Lê um arquivo OFX com o ofxparse (caminho alternativo de ler_ofx)."""
     try:
         # Tentar ler o arquivo com diferentes codificações
         try:
@@ -52,108 +147,135 @@ def ler_ofx(arquivo_ofx):
             if not isinstance(descricao, str):
                 descricao = str(descricao)
             
-            transacoes.append({
-                'data': transacao.date,
-                'valor': float(transacao.amount),
-                'descricao': descricao
-            })
+            transacoes.append(Transacao(
+                data=transacao.date,
+                valor=float(transacao.amount),
+                centavos=para_centavos(transacao.amount),
+                descricao=descricao,
+                fitid=getattr(transacao, 'id', '') or '',
+                id=len(transacoes)
+            ))
         
         return transacoes
     except Exception as e:
         raise Exception(f"Erro ao processar arquivo OFX: {str(e)}")
 
-def carregar_relatorio_dataframe(arquivo, nome_arquivo):
-    """Carrega um arquivo CSV/Excel em um DataFrame pandas."""
+TAMANHO_AMOSTRA_CSV = 64 * 1024  # Bytes lidos para detectar o dialeto do CSV
+DELIMITADORES_CSV = [';', ',', '\t', '|']
+
+_NUMERO_DECIMAL_VIRGULA = re.compile(r'^[-+]?(R\$\s?)?(\d{1,3}(\.\d{3})+|\d+),\d{1,2}$')
+_NUMERO_DECIMAL_PONTO = re.compile(r'^[-+]?(R\$\s?)?(\d{1,3}(,\d{3})+|\d+)\.\d{1,2}$')
+
+def detectar_dialeto_csv(amostra, completa=False):
+    """
+    Detecta, a partir de uma amostra limitada de bytes do início do arquivo,
+    o encoding, o delimitador, o separador decimal e a linha de cabeçalho do CSV.
+    completa indica que a amostra contém o arquivo inteiro (última linha não cortada).
+    Retorna um dicionário {'encoding', 'sep', 'decimal', 'header'}; 'encoding' é None
+    quando a amostra não basta para decidir (ver _encodings_dialeto).
+    """
+    if not completa and b'\n' in amostra:
+        # Descartar a última linha, possivelmente cortada no meio (inclusive no meio de um caractere)
+        amostra = amostra[:amostra.rindex(b'\n') + 1]
+    
+    # Encoding: UTF-8 estrito primeiro (mantendo o BOM, como nos perfis salvos), depois cp1252
+    for encoding in ['utf-8', 'cp1252', 'latin1']:
+        try:
+            texto = amostra.decode(encoding)
+            break
+        except UnicodeDecodeError:
+            continue
+    
+    # Amostra só com bytes ASCII decodifica como qualquer encoding: o primeiro acento,
+    # mais adiante no arquivo, pode ser UTF-8 ou cp1252. Fica indeterminado.
+    if not completa and amostra.isascii():
+        encoding = None
+    
+    # Linhas não vazias, com o número da linha física no arquivo: o cabeçalho é
+    # passado ao pandas como skiprows, que conta também as linhas em branco
+    numeradas = [(num, linha) for num, linha in enumerate(texto.splitlines()[:200]) if linha.strip()]
+    linhas = [linha for _, linha in numeradas]
+    
+    # Delimitador: o que produz o maior número de linhas com a mesma quantidade de campos
+    melhor = (0, 0)
+    sep = DELIMITADORES_CSV[0]
+    campos_por_linha = []
+    for delimitador in DELIMITADORES_CSV:
+        contagens = [len(campos) for campos in csv.reader(linhas, delimiter=delimitador)]
+        frequentes = Counter(c for c in contagens if c > 1)
+        if not frequentes:
+            continue
+        qtd_campos, qtd_linhas = frequentes.most_common(1)[0]
+        if (qtd_linhas, qtd_campos) > melhor:
+            melhor = (qtd_linhas, qtd_campos)
+            sep = delimitador
+            campos_por_linha = contagens
+    
+    # Cabeçalho: primeira linha com a quantidade de campos dominante (pula títulos de relatório)
+    inicio_dados = 0
+    for pos, qtd in enumerate(campos_por_linha):
+        if qtd == melhor[1]:
+            inicio_dados = pos
+            break
+    header = numeradas[inicio_dados][0] if numeradas else 0
+    
+    # Separador decimal: formato predominante entre os campos numéricos
+    virgula = ponto = 0
+    for campos in csv.reader(linhas[inicio_dados + 1:], delimiter=sep):
+        for campo in campos:
+            campo = campo.strip()
+            if _NUMERO_DECIMAL_VIRGULA.match(campo):
+                virgula += 1
+            elif _NUMERO_DECIMAL_PONTO.match(campo):
+                ponto += 1
+    decimal = '.' if ponto > virgula else ','
+    
+    return {'encoding': encoding, 'sep': sep, 'decimal': decimal, 'header': header}
+
+def _encodings_dialeto(dialeto):
+    """Encodings a tentar na leitura: o detectado ou, se indeterminado, UTF-8 e depois cp1252."""
+    return [dialeto['encoding']] if dialeto.get('encoding') else ['utf-8', 'cp1252']
+
+def carregar_relatorio_dataframe(arquivo, nome_arquivo, dialeto=None):
+    """
+    Carrega um arquivo CSV/Excel em um DataFrame pandas.
+    Para CSV, o dialeto (encoding, delimitador, decimal e cabeçalho) é detectado
+    em uma única passada sobre uma amostra e o arquivo é lido uma só vez com o
+    motor C do pandas. O dialeto usado fica em df.attrs['dialeto'], para ser salvo
+    no perfil de mapeamento; um dialeto já conhecido pode ser informado diretamente.
+    Se o encoding ficou indeterminado na amostra, o que ler o arquivo inteiro sem
+    erro é o que vai para df.attrs['dialeto'].
+    """
     if nome_arquivo.endswith('.csv'):
-        # Tentar diferentes encodings e delimitadores
-        encodings = ['cp1252', 'utf-8', 'latin1', 'iso-8859-1']
-        delimiters = [',', ';', '\t', '|']
-        
-        # Primeiro, tentar ler algumas linhas para análise
         try:
-            # Resetar o ponteiro do arquivo para o início
-            arquivo.seek(0)
-            sample_data = arquivo.read(2048)  # Ler uma amostra para detecção
-            arquivo.seek(0)  # Resetar novamente
-            
-            # Tentar detectar o delimitador analisando a amostra
-            sample_str = sample_data.decode('utf-8', errors='ignore')
-            delimiter_counts = {d: sample_str.count(d) for d in delimiters}
+            if dialeto is None:
+                arquivo.seek(0)
+                amostra = arquivo.read(TAMANHO_AMOSTRA_CSV)
+                dialeto = detectar_dialeto_csv(amostra, completa=len(amostra) < TAMANHO_AMOSTRA_CSV)
             
-            # Ordenar delimitadores por frequência (mais frequente primeiro)
-            sorted_delimiters = sorted(delimiters, key=lambda d: delimiter_counts[d], reverse=True)
-        except Exception:
-            sorted_delimiters = delimiters
-        
-        # Tentar cada combinação de encoding e delimitador
-        for encoding in encodings:
-            for delimiter in sorted_delimiters:
+            for encoding in _encodings_dialeto(dialeto):
+                arquivo.seek(0)
                 try:
-                    # Resetar o ponteiro do arquivo para o início
-                    arquivo.seek(0)
-                    
-                    # Tentar com diferentes configurações
                     df = pd.read_csv(
-                        arquivo, 
-                        encoding=encoding, 
-                        sep=delimiter, 
-                        engine='python',
-                        on_bad_lines='skip',  # Updated from error_bad_lines
-                        low_memory=False        # Melhor para arquivos complexos
+                        arquivo,
+                        encoding=encoding,
+                        sep=dialeto['sep'],
+                        skiprows=dialeto['header'],
+                        engine='c',
+                        on_bad_lines='skip',
+                        low_memory=False
                     )
-                    
-                    # Verificar se o arquivo foi lido corretamente
-                    if len(df.columns) > 1:
-                        return df
-                except Exception:
+                except UnicodeDecodeError:
                     continue
-        
-        # Se nenhuma combinação funcionou, tentar métodos alternativos
-        try:
-            # Resetar o ponteiro do arquivo
-            arquivo.seek(0)
-            
-            # Tentar com o pandas para detectar automaticamente
-            df = pd.read_csv(
-                arquivo, 
-                encoding='utf-8', 
-                sep=None,  # Tentar detectar automaticamente
-                engine='python',
-                on_bad_lines='skip',  # Updated from error_bad_lines
-                low_memory=False
-            )
-            return df
+                if len(df.columns) > 1:
+                    df.attrs['dialeto'] = dict(dialeto, encoding=encoding)
+                    return df
+                break
         except Exception:
             pass
         
-        # Tentar com o método de leitura de texto e processamento manual
-        try:
-            # Resetar o ponteiro do arquivo
-            arquivo.seek(0)
-            
-            # Ler como texto e processar manualmente
-            content = arquivo.read().decode('utf-8', errors='ignore')
-            lines = content.splitlines()
-            
-            if not lines:
-                raise Exception("Arquivo vazio")
-            
-            # Detectar delimitador na primeira linha
-            first_line = lines[0]
-            best_delimiter = max(delimiters, key=lambda d: first_line.count(d))
-            
-            # Criar DataFrame a partir das linhas divididas
-            rows = [line.split(best_delimiter) for line in lines]
-            
-            # Garantir que todas as linhas tenham o mesmo número de colunas
-            max_cols = max(len(row) for row in rows)
-            padded_rows = [row + [''] * (max_cols - len(row)) for row in rows]
-            
-            # Criar DataFrame
-            df = pd.DataFrame(padded_rows[1:], columns=padded_rows[0])
-            return df
-        except Exception as e:
-            raise Exception(f"Não foi possível ler o arquivo CSV: {str(e)}")
+        # Se a detecção falhar, recorrer às tentativas com vários encodings e delimitadores
+        return _carregar_csv_tentativas(arquivo)
     else:
         try:
             df = pd.read_excel(arquivo)
@@ -161,9 +283,109 @@ def carregar_relatorio_dataframe(arquivo, nome_arquivo):
         except Exception as e:
             raise Exception(f"Não foi possível ler o arquivo Excel: {str(e)}")
 
+def _carregar_csv_tentativas(arquivo):
+    """Lê um CSV testando combinações de encoding e delimitador (caminho alternativo)."""
+    # Tentar diferentes encodings e delimitadores
+    encodings = ['cp1252', 'utf-8', 'latin1', 'iso-8859-1']
+    delimiters = [',', ';', '\t', '|']
+    
+    # Primeiro, tentar ler algumas linhas para análise
+    try:
+        # Resetar o ponteiro do arquivo para o início
+        arquivo.seek(0)
+        sample_data = arquivo.read(2048)  # Ler uma amostra para detecção
+        arquivo.seek(0)  # Resetar novamente
+        
+        # Tentar detectar o delimitador analisando a amostra
+        sample_str = sample_data.decode('utf-8', errors='ignore')
+        delimiter_counts = {d: sample_str.count(d) for d in delimiters}
+        
+        # Ordenar delimitadores por frequência (mais frequente primeiro)
+        sorted_delimiters = sorted(delimiters, key=lambda d: delimiter_counts[d], reverse=True)
+    except Exception:
+        sorted_delimiters = delimiters
+    
+    # Tentar cada combinação de encoding e delimitador
+    for encoding in encodings:
+        for delimiter in sorted_delimiters:
+            try:
+                # Resetar o ponteiro do arquivo para o início
+                arquivo.seek(0)
+                
+                # Tentar com diferentes configurações
+                df = pd.read_csv(
+                    arquivo, 
+                    encoding=encoding, 
+                    sep=delimiter, 
+                    engine='python',
+                    on_bad_lines='skip',  # Updated from error_bad_lines
+                    low_memory=False        # Melhor para arquivos complexos
+                )
+                
+                # Verificar se o arquivo foi lido corretamente
+                if len(df.columns) > 1:
+                    return df
+            except Exception:
+                continue
+    
+    # Se nenhuma combinação funcionou, tentar métodos alternativos
+    try:
+        # Resetar o ponteiro do arquivo
+        arquivo.seek(0)
+        
+        # Tentar com o pandas para detectar automaticamente
+        df = pd.read_csv(
+            arquivo, 
+            encoding='utf-8', 
+            sep=None,  # Tentar detectar automaticamente
+            engine='python',
+            on_bad_lines='skip',  # Updated from error_bad_lines
+            low_memory=False
+        )
+        return df
+    except Exception:
+        pass
+    
+    # Tentar com o método de leitura de texto e processamento manual
+    try:
+        # Resetar o ponteiro do arquivo
+        arquivo.seek(0)
+        
+        # Ler como texto e processar manualmente
+        content = arquivo.read().decode('utf-8', errors='ignore')
+        lines = content.splitlines()
+        
+        if not lines:
+            raise Exception("Arquivo vazio")
+        
+        # Detectar delimitador na primeira linha
+        first_line = lines[0]
+        best_delimiter = max(delimiters, key=lambda d: first_line.count(d))
+        
+        # Criar DataFrame a partir das linhas divididas
+        rows = [line.split(best_delimiter) for line in lines]
+        
+        # Garantir que todas as linhas tenham o mesmo número de colunas
+        max_cols = max(len(row) for row in rows)
+        padded_rows = [row + [''] * (max_cols - len(row)) for row in rows]
+        
+        # Criar DataFrame
+        df = pd.DataFrame(padded_rows[1:], columns=padded_rows[0])
+        return df
+    except Exception as e:
+        raise Exception(f"Não foi possível ler o arquivo CSV: {str(e)}")
+
+# Lista de formatos comuns de data, em ordem de preferência
+FORMATOS_DATA = [
+    '%d/%m/%Y', '%Y-%m-%d', '%d-%m-%Y', '%m/%d/%Y', 
+    '%d.%m.%Y', '%Y.%m.%d', '%d-%b-%Y', '%d/%b/%Y',
+    '%d/%m/%y', '%y-%m-%d', '%m/%d/%y', '%d.%m.%y'
+]
+
 def parse_date(date_str):
     """
     Tenta converter uma string de data em um objeto datetime usando vários formatos comuns.
+    O resultado é memorizado por texto, pois relatórios repetem as mesmas datas milhares de vezes.
     """
     if pd.isna(date_str) or date_str == '':
         return None
@@ -172,21 +394,14 @@ def parse_date(date_str):
     if isinstance(date_str, datetime):
         return date_str
     
-    # Converter para string se não for
-    date_str = str(date_str).strip()
-    
-    # Remover horas se presentes
-    date_str = date_str.split(' ')[0]
-    
-    # Lista de formatos comuns de data
-    date_formats = [
-        '%d/%m/%Y', '%Y-%m-%d', '%d-%m-%Y', '%m/%d/%Y', 
-        '%d.%m.%Y', '%Y.%m.%d', '%d-%b-%Y', '%d/%b/%Y',
-        '%d/%m/%y', '%y-%m-%d', '%m/%d/%y', '%d.%m.%y'
-    ]
-    
+    # Converter para string e remover horas se presentes
+    return _parse_date_texto(str(date_str).strip().split(' ')[0])
+
+@lru_cache(maxsize=4096)
+def _parse_date_texto(date_str):
+    """Converte o texto de uma data (sem horas), testando cada formato de FORMATOS_DATA."""
     # Tentar cada formato
-    for fmt in date_formats:
+    for fmt in FORMATOS_DATA:
         try:
             return datetime.strptime(date_str, fmt)
         except ValueError:
@@ -212,17 +427,73 @@ def parse_date(date_str):
     # Se tudo falhar, retornar None
     return None
 
-def converter_dataframe(df, mapeamento, tipo_relatorio, filtro_conta=None, debug=False):
-    """Converte um DataFrame para o formato padronizado de transações."""
-    transacoes = []
-    problematic_dates = []
+def inferir_formato_data(textos, tamanho_amostra=200):
+    """
+    Infere o formato de data dominante de uma coluna a partir de uma amostra
+    dos seus valores distintos (já sem horas). Vence o formato que reconhece
+    mais valores; empates seguem a ordem de FORMATOS_DATA.
+    Retorna o formato ou None se nenhum reconhecer a amostra.
+    """
+    amostra = pd.Series(textos).dropna().drop_duplicates().head(tamanho_amostra).tolist()
+    melhor_formato, melhor_contagem = None, 0
+    for fmt in FORMATOS_DATA:
+        contagem = 0
+        for texto in amostra:
+            try:
+                datetime.strptime(texto, fmt)
+                contagem += 1
+            except ValueError:
+                continue
+        if contagem > melhor_contagem:
+            melhor_formato, melhor_contagem = fmt, contagem
+            if contagem == len(amostra):
+                break
+    return melhor_formato
+
+def parse_date_coluna(serie):
+    """
+    Converte uma coluna inteira de datas: infere o formato dominante uma única vez,
+    aplica-o em bloco com pd.to_datetime e só usa parse_date (memorizado) para os
+    valores fora do padrão. O trabalho é feito sobre os valores distintos da coluna,
+    já que exportações repetem as mesmas poucas datas em milhares de linhas.
+    Retorna uma Series datetime64 sem horário (NaT se inválida).
+    """
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie.dt.normalize()
     
-    # Verificar se o DataFrame não está vazio
-    if df.empty:
-        print("DataFrame vazio - nenhum dado para processar")
-        return transacoes
-        
-    # Verificar se as colunas mapeadas existem no DataFrame
+    codigos, distintos = pd.factorize(serie)
+    distintos = pd.Series(distintos, dtype=object)
+    
+    # Valores que já são datetime (ex.: Excel com colunas mistas) são mantidos
+    eh_data = distintos.map(lambda v: isinstance(v, datetime)).astype(bool)
+    texto = distintos.where(~eh_data).astype('string').str.strip().str.split(' ').str[0]
+    texto = texto.mask(texto == '')
+    
+    formato = inferir_formato_data(texto)
+    if formato:
+        datas = pd.to_datetime(texto, format=formato, errors='coerce')
+    else:
+        datas = pd.Series(pd.NaT, index=distintos.index, dtype='datetime64[ns]')
+    if eh_data.any():
+        datas = datas.where(~eh_data, pd.to_datetime(distintos.where(eh_data), errors='coerce'))
+    
+    # Valores fora do formato dominante: conversão individual
+    outliers = datas.isna() & texto.notna()
+    if outliers.any():
+        datas = datas.where(~outliers, pd.to_datetime(texto[outliers].map(parse_date), errors='coerce'))
+    
+    # Reexpandir para todas as linhas (código -1 = célula vazia)
+    valores = datas.dt.normalize().to_numpy()
+    resultado = pd.Series(valores.take(codigos.clip(min=0)) if len(valores) else pd.NaT, index=serie.index)
+    return resultado.mask(codigos < 0)
+
+COLUNAS_TRANSACAO = ['data', 'valor', 'centavos', 'descricao', 'conta', 'receita', 'despesa']
+
+NATUREZAS_DEBITO = ['D', 'DEBITO', 'DÉBITO', 'DEBIT', 'SAIDA', 'SAÍDA', '-']
+NATUREZAS_CREDITO = ['C', 'CREDITO', 'CRÉDITO', 'CREDIT', 'ENTRADA', '+']
+
+def _verificar_colunas(df, mapeamento, tipo_relatorio):
+    """Avisa sobre colunas necessárias que não estão mapeadas ou não existem no DataFrame."""
     colunas_necessarias = ['data', 'descricao']
     if tipo_relatorio == "Única coluna com Natureza (C/D)":
         colunas_necessarias.extend(['valor', 'natureza'])
@@ -238,149 +509,307 @@ def converter_dataframe(df, mapeamento, tipo_relatorio, filtro_conta=None, debug
         if coluna not in mapeamento or not mapeamento[coluna]:
             print(f"Aviso: Coluna '{coluna}' não está mapeada")
             continue
-        if mapeamento[coluna] not in df.columns:
+        if _coluna(df, mapeamento, coluna) is None:
             print(f"Aviso: Coluna mapeada '{mapeamento[coluna]}' não existe no DataFrame")
             print(f"Colunas disponíveis: {', '.join(df.columns)}")
             continue
+
+def _coluna(df, mapeamento, campo):
+    """
+    Retorna o nome da coluna mapeada para o campo, se ela existir no DataFrame.
+    Perfis antigos guardam o BOM do UTF-8 no nome da primeira coluna ('\ufeffData'),
+    que a leitura com o motor C descarta; por isso a comparação o ignora.
+    """
+    nome = mapeamento.get(campo)
+    if not nome:
+        return None
+    if nome in df.columns:
+        return nome
+    sem_bom = nome.lstrip('\ufeff')
+    return sem_bom if sem_bom in df.columns else None
+
+def _limpar_numero_texto(texto, decimal=','):
+    """
+    Remove o separador de milhar e troca o separador decimal por ponto
+    ('1.234,56' -> '1234.56'; com decimal='.', '1,234.56' -> '1234.56').
+    """
+    milhar = '.' if decimal == ',' else ','
+    return texto.replace(milhar, '').replace(decimal, '.').strip()
+
+def _converter_valores(serie, decimal=','):
+    """
+    Converte uma coluna de valores monetários para float de forma vetorizada.
+    Textos passam pela mesma limpeza do caminho linha a linha ('1.234,56' -> 1234.56),
+    de acordo com o separador decimal detectado no arquivo.
+    Retorna (valores, falhas): falhas marca as células preenchidas que não puderam ser
+    convertidas e devem seguir para o processamento linha a linha.
+    """
+    if pd.api.types.is_numeric_dtype(serie):
+        valores = serie.astype(float)
+        return valores, pd.Series(False, index=serie.index)
     
-    # Aplicar filtro de conta, se fornecido
-    if filtro_conta and mapeamento['conta'] and mapeamento['conta'] in df.columns:
-        df = df[df[mapeamento['conta']] == filtro_conta]
+    milhar = '.' if decimal == ',' else ','
+    eh_texto = serie.map(type).eq(str)
+    texto = serie.where(eh_texto).astype('string')
+    limpo = (
+        texto.str.replace(r'[^\d.,+-]', '', regex=True)
+        .str.replace(milhar, '', regex=False)
+        .str.replace(decimal, '.', regex=False)
+        .str.strip()
+        .replace('', '0')  # Texto sem dígitos vale 0, como no caminho linha a linha
+    )
+    valores = pd.to_numeric(limpo, errors='coerce').astype(float)
+    # Células não textuais (ex.: números vindos de Excel) são convertidas diretamente
+    valores = valores.where(eh_texto, pd.to_numeric(serie.where(~eh_texto), errors='coerce'))
+    falhas = valores.isna() & serie.notna()
+    return valores, falhas
+
+def _converter_datas(serie):
+    """
+    Converte uma coluna de datas de forma vetorizada (ver parse_date_coluna).
+    Retorna (datas, falhas), com falhas marcando células preenchidas não reconhecidas.
+    """
+    datas = parse_date_coluna(serie)
+    falhas = datas.isna() & serie.notna() & serie.astype('string').str.strip().ne('')
+    return datas, falhas
+
+def _converter_linha(idx, row, df, mapeamento, tipo_relatorio, debug=False, problematic_dates=None, decimal=','):
+    """
+    Converte uma única linha do DataFrame (caminho linha a linha).
+    Usado como alternativa para as linhas que a conversão vetorizada não reconheceu.
+    Retorna o dicionário da transação ou None se a linha deve ser ignorada.
+    """
+    # Processar data com tratamento robusto
+    if 'data' not in mapeamento or not mapeamento['data'] or mapeamento['data'] not in df.columns:
+        if debug:
+            print(f"Pulando linha {idx}: coluna de data não encontrada")
+        return None
+        
+    data_str = row[mapeamento['data']]
+    data = parse_date(data_str)
+    
+    if data is None:
+        if debug and problematic_dates is not None:
+            problematic_dates.append((idx, data_str))
+        return None  # Pular linhas com datas inválidas
+    
+    # Inicializar valores
+    valor = 0
+    receita = 0
+    despesa = 0
     
-    # Processar cada linha do DataFrame
-    for idx, row in df.iterrows():
-        # Processar data com tratamento robusto
-        if 'data' not in mapeamento or not mapeamento['data'] or mapeamento['data'] not in df.columns:
+    if tipo_relatorio == "Única coluna com Natureza (C/D)":
+        # Verificar se as colunas necessárias existem
+        if not mapeamento['valor'] or not mapeamento['natureza'] or \
+           mapeamento['valor'] not in df.columns or mapeamento['natureza'] not in df.columns:
             if debug:
-                print(f"Pulando linha {idx}: coluna de data não encontrada")
-            continue
+                print(f"Pulando linha {idx}: colunas de valor ou natureza não encontradas")
+            return None
             
-        data_str = row[mapeamento['data']]
-        data = parse_date(data_str)
-        
-        if data is None:
-            if debug:
-                problematic_dates.append((idx, data_str))
-            continue  # Pular linhas com datas inválidas
-        
-        # Inicializar valores
-        valor = 0
-        receita = 0
-        despesa = 0
+        valor_str = row[mapeamento['valor']]
+        natureza_str = str(row[mapeamento['natureza']]).strip().upper()
         
-        if tipo_relatorio == "Única coluna com Natureza (C/D)":
-            # Verificar se as colunas necessárias existem
-            if not mapeamento['valor'] or not mapeamento['natureza'] or \
-               mapeamento['valor'] not in df.columns or mapeamento['natureza'] not in df.columns:
-                if debug:
-                    print(f"Pulando linha {idx}: colunas de valor ou natureza não encontradas")
-                continue
-                
-            valor_str = row[mapeamento['valor']]
-            natureza_str = str(row[mapeamento['natureza']]).strip().upper()
-            
-            # Converter valor para float, tratando diferentes formatos
-            if pd.isna(valor_str):
-                continue  # Pular se o valor for NaN
-                
-            if isinstance(valor_str, str):
-                # Remover caracteres não numéricos, exceto ponto, vírgula e sinais
-                valor_str = re.sub(r'[^\d.,+-]', '', valor_str)
-                # Substituir vírgula por ponto para conversão
-                valor_str = valor_str.replace('.', '').replace(',', '.').strip()
-                try:
-                    valor = float(valor_str) if valor_str else 0
-                except ValueError:
-                    # Tentar extrair números da string
-                    match = re.search(r'[-+]?\d*[.,]?\d+', valor_str)
-                    if match:
-                        valor = float(match.group().replace(',', '.'))
-                    else:
-                        continue  # Pular se não conseguir converter
-            else:
-                try:
-                    valor = float(valor_str)
-                except (ValueError, TypeError):
-                    continue  # Pular se não conseguir converter
+        # Converter valor para float, tratando diferentes formatos
+        if pd.isna(valor_str):
+            return None  # Pular se o valor for NaN
             
-            # Ajustar sinal conforme natureza (D=débito, C=crédito)
-            # Verificar várias possibilidades de indicação de natureza
-            if natureza_str in ['D', 'DEBITO', 'DÉBITO', 'DEBIT', 'SAIDA', 'SAÍDA', '-']:
-                valor = -abs(valor)
-            elif natureza_str in ['C', 'CREDITO', 'CRÉDITO', 'CREDIT', 'ENTRADA', '+']:
-                valor = abs(valor)
-            # Se não for possível determinar a natureza, usar o sinal do valor
-            
-            receita = valor if valor > 0 else 0
-            despesa = abs(valor) if valor < 0 else 0
+        if isinstance(valor_str, str):
+            # Remover caracteres não numéricos, exceto ponto, vírgula e sinais
+            valor_str = re.sub(r'[^\d.,+-]', '', valor_str)
+            # Normalizar separadores (decimal vira ponto) para conversão
+            valor_str = _limpar_numero_texto(valor_str, decimal)
+            try:
+                valor = float(valor_str) if valor_str else 0
+            except ValueError:
+                # Tentar extrair números da string
+                match = re.search(r'[-+]?\d*[.,]?\d+', valor_str)
+                if match:
+                    valor = float(match.group().replace(',', '.'))
+                else:
+                    return None  # Pular se não conseguir converter
         else:
-            # Relatório com colunas separadas para receita e despesa
-            # Processar coluna de receita (entradas - valores positivos)
-            if mapeamento['receita'] and mapeamento['receita'] in df.columns:
-                receita_val = row[mapeamento['receita']]
-                if pd.notna(receita_val) and receita_val != '':
-                    if isinstance(receita_val, str):
-                        # Limpar a string para conversão
-                        receita_val = re.sub(r'[^\d.,+-]', '', str(receita_val))
-                        receita_val = receita_val.replace('.', '').replace(',', '.').strip()
-                        try:
-                            receita = float(receita_val) if receita_val else 0
-                        except ValueError:
-                            match = re.search(r'[-+]?\d*[.,]?\d+', receita_val)
-                            if match:
-                                receita = float(match.group().replace(',', '.'))
-                            else:
-                                receita = 0
-                    else:
-                        try:
-                            receita = float(receita_val) if pd.notna(receita_val) else 0
-                        except (ValueError, TypeError):
+            try:
+                valor = float(valor_str)
+            except (ValueError, TypeError):
+                return None  # Pular se não conseguir converter
+        
+        # Ajustar sinal conforme natureza (D=débito, C=crédito)
+        # Verificar várias possibilidades de indicação de natureza
+        if natureza_str in NATUREZAS_DEBITO:
+            valor = -abs(valor)
+        elif natureza_str in NATUREZAS_CREDITO:
+            valor = abs(valor)
+        # Se não for possível determinar a natureza, usar o sinal do valor
+        
+        receita = valor if valor > 0 else 0
+        despesa = abs(valor) if valor < 0 else 0
+        centavos = para_centavos(valor)
+    else:
+        # Relatório com colunas separadas para receita e despesa
+        # Processar coluna de receita (entradas - valores positivos)
+        if mapeamento['receita'] and mapeamento['receita'] in df.columns:
+            receita_val = row[mapeamento['receita']]
+            if pd.notna(receita_val) and receita_val != '':
+                if isinstance(receita_val, str):
+                    # Limpar a string para conversão
+                    receita_val = re.sub(r'[^\d.,+-]', '', str(receita_val))
+                    receita_val = _limpar_numero_texto(receita_val, decimal)
+                    try:
+                        receita = float(receita_val) if receita_val else 0
+                    except ValueError:
+                        match = re.search(r'[-+]?\d*[.,]?\d+', receita_val)
+                        if match:
+                            receita = float(match.group().replace(',', '.'))
+                        else:
                             receita = 0
-                
-                # Garantir que receita seja positiva
-                receita = abs(receita)
+                else:
+                    try:
+                        receita = float(receita_val) if pd.notna(receita_val) else 0
+                    except (ValueError, TypeError):
+                        receita = 0
             
-            # Processar coluna de despesa (saídas - valores negativos)
-            if mapeamento['despesa'] and mapeamento['despesa'] in df.columns:
-                despesa_val = row[mapeamento['despesa']]
-                if pd.notna(despesa_val) and despesa_val != '':
-                    if isinstance(despesa_val, str):
-                        # Limpar a string para conversão
-                        despesa_val = re.sub(r'[^\d.,+-]', '', str(despesa_val))
-                        despesa_val = despesa_val.replace('.', '').replace(',', '.').strip()
-                        try:
-                            despesa = float(despesa_val) if despesa_val else 0
-                        except ValueError:
-                            match = re.search(r'[-+]?\d*[.,]?\d+', despesa_val)
-                            if match:
-                                despesa = float(match.group().replace(',', '.'))
-                            else:
-                                despesa = 0
-                    else:
-                        try:
-                            despesa = float(despesa_val) if pd.notna(despesa_val) else 0
-                        except (ValueError, TypeError):
+            # Garantir que receita seja positiva
+            receita = abs(receita)
+        
+        # Processar coluna de despesa (saídas - valores negativos)
+        if mapeamento['despesa'] and mapeamento['despesa'] in df.columns:
+            despesa_val = row[mapeamento['despesa']]
+            if pd.notna(despesa_val) and despesa_val != '':
+                if isinstance(despesa_val, str):
+                    # Limpar a string para conversão
+                    despesa_val = re.sub(r'[^\d.,+-]', '', str(despesa_val))
+                    despesa_val = _limpar_numero_texto(despesa_val, decimal)
+                    try:
+                        despesa = float(despesa_val) if despesa_val else 0
+                    except ValueError:
+                        match = re.search(r'[-+]?\d*[.,]?\d+', despesa_val)
+                        if match:
+                            despesa = float(match.group().replace(',', '.'))
+                        else:
                             despesa = 0
-                
-                # Garantir que despesa seja positiva para armazenamento
-                despesa = abs(despesa)
+                else:
+                    try:
+                        despesa = float(despesa_val) if pd.notna(despesa_val) else 0
+                    except (ValueError, TypeError):
+                        despesa = 0
             
-            # Calcular o valor líquido (receita - despesa)
-            valor = receita - despesa
+            # Garantir que despesa seja positiva para armazenamento
+            despesa = abs(despesa)
+        
+        # Calcular o valor líquido (receita - despesa), exato em centavos
+        valor = receita - despesa
+        centavos = para_centavos(receita) - para_centavos(despesa)
+    
+    # Obter descrição e conta
+    descricao = str(row[mapeamento['descricao']]) if 'descricao' in mapeamento and mapeamento['descricao'] in df.columns and pd.notna(row[mapeamento['descricao']]) else ''
+    conta = str(row[mapeamento['conta']]) if 'conta' in mapeamento and mapeamento['conta'] in df.columns and pd.notna(row[mapeamento['conta']]) else ''
+    
+    return {
+        'data': data,
+        'valor': valor,
+        'centavos': centavos,
+        'descricao': descricao,
+        'conta': conta,
+        'receita': receita,
+        'despesa': despesa
+    }
+
+def converter_dataframe_colunar(df, mapeamento, tipo_relatorio, filtro_conta=None, debug=False):
+    """
+    Converte um DataFrame para o formato padronizado de transações usando
+    operações por coluna, sem iterar linha a linha.
+    Linhas que a conversão vetorizada não reconhece (datas ou valores fora do padrão)
+    passam pelo caminho linha a linha. Retorna um DataFrame com as colunas de
+    COLUNAS_TRANSACAO, na ordem original das linhas.
+    O separador decimal vem de df.attrs['dialeto'] quando o CSV foi detectado
+    por carregar_relatorio_dataframe (padrão: vírgula).
+    """
+    vazio = pd.DataFrame(columns=COLUNAS_TRANSACAO)
+    decimal = df.attrs.get('dialeto', {}).get('decimal', ',')
+    
+    # Verificar se o DataFrame não está vazio
+    if df.empty:
+        print("DataFrame vazio - nenhum dado para processar")
+        return vazio
+    
+    _verificar_colunas(df, mapeamento, tipo_relatorio)
+    
+    # Nomes de colunas do mapeamento resolvidos para os do DataFrame (ver _coluna)
+    mapeamento = {campo: _coluna(df, mapeamento, campo) or nome for campo, nome in mapeamento.items()}
+    
+    # Aplicar filtro de conta, se fornecido
+    if filtro_conta and mapeamento.get('conta') and mapeamento['conta'] in df.columns:
+        df = df[df[mapeamento['conta']] == filtro_conta]
+    
+    col_data = _coluna(df, mapeamento, 'data')
+    if col_data is None:
+        if debug:
+            print("Nenhuma linha processada: coluna de data não encontrada")
+        return vazio
+    
+    datas, falhas = _converter_datas(df[col_data])
+    validas = datas.notna()
+    
+    if tipo_relatorio == "Única coluna com Natureza (C/D)":
+        col_valor = _coluna(df, mapeamento, 'valor')
+        col_natureza = _coluna(df, mapeamento, 'natureza')
+        if col_valor is None or col_natureza is None:
+            if debug:
+                print("Nenhuma linha processada: colunas de valor ou natureza não encontradas")
+            return vazio
         
-        # Obter descrição e conta
-        descricao = str(row[mapeamento['descricao']]) if 'descricao' in mapeamento and mapeamento['descricao'] in df.columns and pd.notna(row[mapeamento['descricao']]) else ''
-        conta = str(row[mapeamento['conta']]) if 'conta' in mapeamento and mapeamento['conta'] in df.columns and pd.notna(row[mapeamento['conta']]) else ''
+        valor, falhas_valor = _converter_valores(df[col_valor], decimal)
+        falhas |= falhas_valor
+        validas &= valor.notna()  # Valores vazios (NaN) são ignorados
         
-        # Adicionar transação ao resultado
-        transacoes.append({
-            'data': data,
-            'valor': valor,
-            'descricao': descricao,
-            'conta': conta,
-            'receita': receita,
-            'despesa': despesa
-        })
+        # Ajustar sinal conforme natureza (D=débito, C=crédito); sem natureza, mantém o sinal
+        natureza = df[col_natureza].astype(str).str.strip().str.upper()
+        valor = valor.mask(natureza.isin(NATUREZAS_DEBITO), -valor.abs())
+        valor = valor.mask(natureza.isin(NATUREZAS_CREDITO), valor.abs())
+        
+        receita = valor.clip(lower=0)
+        despesa = (-valor).clip(lower=0)
+        centavos = serie_para_centavos(valor)
+    else:
+        receita = pd.Series(0.0, index=df.index)
+        despesa = pd.Series(0.0, index=df.index)
+        col_receita = _coluna(df, mapeamento, 'receita')
+        col_despesa = _coluna(df, mapeamento, 'despesa')
+        if col_receita is not None:
+            receita, falhas_receita = _converter_valores(df[col_receita], decimal)
+            falhas |= falhas_receita
+            receita = receita.fillna(0).abs()
+        if col_despesa is not None:
+            despesa, falhas_despesa = _converter_valores(df[col_despesa], decimal)
+            falhas |= falhas_despesa
+            despesa = despesa.fillna(0).abs()
+        
+        valor = receita - despesa
+        centavos = serie_para_centavos(receita) - serie_para_centavos(despesa)
+    
+    col_descricao = _coluna(df, mapeamento, 'descricao')
+    col_conta = _coluna(df, mapeamento, 'conta')
+    resultado = pd.DataFrame({
+        'data': datas,
+        'valor': valor,
+        'centavos': centavos,
+        'descricao': df[col_descricao].fillna('').astype(str) if col_descricao else '',
+        'conta': df[col_conta].fillna('').astype(str) if col_conta else '',
+        'receita': receita,
+        'despesa': despesa,
+    }, index=df.index)
+    resultado = resultado[validas & ~falhas]
+    
+    # Linhas que falharam na conversão vetorizada seguem pelo caminho linha a linha
+    problematic_dates = []
+    if falhas.any():
+        linhas = []
+        for idx, row in df[falhas].iterrows():
+            transacao = _converter_linha(idx, row, df, mapeamento, tipo_relatorio, debug, problematic_dates, decimal)
+            if transacao is not None:
+                linhas.append(pd.DataFrame([transacao], index=[idx]))
+        if linhas:
+            resultado = pd.concat([resultado] + linhas).sort_index(kind='stable')
     
     if debug and problematic_dates:
         print(f"Encontradas {len(problematic_dates)} datas problemáticas:")
@@ -388,6 +817,91 @@ def converter_dataframe(df, mapeamento, tipo_relatorio, filtro_conta=None, debug
             print(f"  Linha {idx}: '{date_str}'")
     
     if debug:
-        print(f"Total de transações processadas: {len(transacoes)}")
+        print(f"Total de transações processadas: {len(resultado)}")
+    
+    resultado['centavos'] = resultado['centavos'].astype('int64')
+    return resultado.reset_index(drop=True)
+
+def converter_dataframe(df, mapeamento, tipo_relatorio, filtro_conta=None, debug=False):
+    """
+    Converte um DataFrame para o formato padronizado de transações.
+    Retorna uma lista de Transacao (uma por linha válida), gerada a partir
+    da conversão vetorizada de converter_dataframe_colunar.
+    """
+    return criar_transacoes(converter_dataframe_colunar(df, mapeamento, tipo_relatorio, filtro_conta, debug))
+
+def carregar_relatorio_em_blocos(arquivo, nome_arquivo, mapeamento, tipo_relatorio,
+                                 filtro_conta=None, tamanho_bloco=50000, dialeto=None):
+    """
+    Lê e converte o relatório em blocos de tamanho fixo, mantendo a memória
+    proporcional aos dados úteis e não a várias cópias do arquivo bruto.
+    Cada bloco lê só as colunas mapeadas, passa pelo filtro de natureza (C/D)
+    e pelo filtro de conta e é convertido antes de ser acumulado.
+    Se nenhum encoding lê o arquivo em blocos (erro de decodificação ou de formato
+    no meio do arquivo), recorre à leitura tolerante de carregar_relatorio_dataframe.
+    Retorna o mesmo DataFrame de converter_dataframe_colunar.
+    """
+    natureza = mapeamento.get('natureza') if tipo_relatorio == "Única coluna com Natureza (C/D)" else None
+    
+    def converter_bloco(bloco):
+        # Filtrar linhas com Natureza válida
+        col_natureza = _coluna(bloco, {'natureza': natureza}, 'natureza')
+        if col_natureza is not None:
+            bloco = bloco[bloco[col_natureza].isin(['C', 'D'])]
+        if bloco.empty:
+            return None
+        return converter_dataframe_colunar(bloco, mapeamento, tipo_relatorio, filtro_conta)
+    
+    if not nome_arquivo.endswith('.csv'):
+        # Excel não permite leitura em blocos: converter o arquivo inteiro de uma vez
+        convertido = converter_bloco(carregar_relatorio_dataframe(arquivo, nome_arquivo))
+        return convertido if convertido is not None else pd.DataFrame(columns=COLUNAS_TRANSACAO)
+    
+    if dialeto is None:
+        arquivo.seek(0)
+        amostra = arquivo.read(TAMANHO_AMOSTRA_CSV)
+        dialeto = detectar_dialeto_csv(amostra, completa=len(amostra) < TAMANHO_AMOSTRA_CSV)
+    
+    # Apenas as colunas mapeadas são lidas (ignorando o BOM, como em _coluna)
+    colunas_uteis = {nome.lstrip('\ufeff') for nome in mapeamento.values() if nome}
+    # Valores sempre como texto: sem isso cada bloco infere o tipo por conta própria
+    # ('1.500' vira 1.5 em um bloco só de números e continua texto em outro)
+    colunas_valor = {mapeamento[campo].lstrip('\ufeff') for campo in ('valor', 'receita', 'despesa')
+                     if mapeamento.get(campo)}
+    
+    def ler_blocos(encoding):
+        arquivo.seek(0)
+        leitor = pd.read_csv(
+            arquivo,
+            encoding=encoding,
+            sep=dialeto['sep'],
+            skiprows=dialeto['header'],
+            usecols=lambda coluna: coluna.lstrip('\ufeff') in colunas_uteis,
+            dtype={nome: str for coluna in colunas_valor for nome in (coluna, '\ufeff' + coluna)},
+            engine='c',
+            on_bad_lines='skip',
+            chunksize=tamanho_bloco
+        )
+        partes = []
+        with leitor:
+            for bloco in leitor:
+                bloco.attrs['dialeto'] = dict(dialeto, encoding=encoding)
+                convertido = converter_bloco(bloco)
+                if convertido is not None and not convertido.empty:
+                    partes.append(convertido)
+        return partes
+    
+    for encoding in _encodings_dialeto(dialeto):
+        try:
+            partes = ler_blocos(encoding)
+            break
+        except (UnicodeDecodeError, pd.errors.ParserError):
+            continue
+    else:
+        print("Aviso: leitura em blocos falhou; usando a leitura tolerante do arquivo inteiro")
+        convertido = converter_bloco(_carregar_csv_tentativas(arquivo))
+        partes = [convertido] if convertido is not None and not convertido.empty else []
     
-    return transacoes
+    if not partes:
+        return pd.DataFrame(columns=COLUNAS_TRANSACAO)
+    return pd.concat(partes, ignore_index=True)
@@ -0,0 +1,277 @@
+import os
+import sqlite3
+from datetime import datetime
+import pandas as pd
+from reconciliation import Conciliador
+
+CAMINHO_HISTORICO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "historico.db")
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS execucoes (
+    id INTEGER PRIMARY KEY,
+    criado_em TEXT NOT NULL,
+    conta TEXT NOT NULL,
+    arquivo_ofx TEXT,
+    arquivo_relatorio TEXT,
+    data_inicio TEXT,
+    data_fim TEXT,
+    conciliados INTEGER,
+    nao_conciliados INTEGER
+);
+CREATE TABLE IF NOT EXISTS transacoes (
+    id INTEGER PRIMARY KEY,
+    execucao_id INTEGER NOT NULL REFERENCES execucoes(id),
+    conta TEXT NOT NULL,
+    origem TEXT NOT NULL,          -- 'extrato' ou 'relatorio'
+    data TEXT NOT NULL,            -- AAAA-MM-DD
+    centavos INTEGER NOT NULL,
+    descricao TEXT,
+    conta_relatorio TEXT,
+    fitid TEXT,
+    status TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS matches (
+    execucao_id INTEGER NOT NULL REFERENCES execucoes(id),
+    ofx_transacao_id INTEGER NOT NULL REFERENCES transacoes(id) ON DELETE CASCADE,
+    rel_transacao_id INTEGER NOT NULL REFERENCES transacoes(id) ON DELETE CASCADE,
+    status TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS agregados_diarios (
+    execucao_id INTEGER NOT NULL REFERENCES execucoes(id),
+    conta TEXT NOT NULL,
+    data TEXT NOT NULL,
+    total_extrato INTEGER NOT NULL,
+    total_relatorio INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    PRIMARY KEY (conta, data)
+);
+CREATE INDEX IF NOT EXISTS idx_transacoes_conta_data ON transacoes (conta, data);
+CREATE INDEX IF NOT EXISTS idx_transacoes_conta_valor ON transacoes (conta, centavos);
+CREATE INDEX IF NOT EXISTS idx_transacoes_status ON transacoes (status, conta, data);
+CREATE INDEX IF NOT EXISTS idx_matches_ofx ON matches (ofx_transacao_id);
+CREATE INDEX IF NOT EXISTS idx_matches_rel ON matches (rel_transacao_id);
+"""
+
+
+def _data_iso(data):
+    """Aceita date/datetime ou texto 'AAAA-MM-DD' / 'DD/MM/AAAA' e devolve 'AAAA-MM-DD'."""
+    if data is None:
+        return None
+    if isinstance(data, str):
+        if "/" in data:
+            return datetime.strptime(data, "%d/%m/%Y").date().isoformat()
+        return data
+    if isinstance(data, datetime):
+        return data.date().isoformat()
+    return data.isoformat()
+
+
+class HistoricoConciliacao:
+    """
+    Histórico local (SQLite) das conciliações: transações de extrato e relatório
+    com o status final, os matches e os totais por dia, indexados por conta, data
+    e valor, para consultas entre meses sem recarregar os arquivos.
+
+    Ao registrar uma conciliação, o período do extrato (da primeira à última data do
+    OFX) substitui o que havia no histórico para a mesma conta: vale sempre a execução
+    mais recente de cada dia. Itens do relatório fora desse período não são gravados,
+    para não apagar dias que só outro extrato cobre.
+    """
+
+    def __init__(self, caminho=CAMINHO_HISTORICO):
+        self.caminho = caminho
+        self.conexao = sqlite3.connect(caminho)
+        self.conexao.execute("PRAGMA foreign_keys = ON")
+        self.conexao.execute("PRAGMA journal_mode = WAL")
+        self.conexao.executescript(_ESQUEMA)
+
+    def fechar(self):
+        self.conexao.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.fechar()
+
+    # --------------------------------------------------
+    # GRAVAÇÃO
+    # --------------------------------------------------
+    def registrar(self, resultado, conta, arquivo_ofx=None, arquivo_relatorio=None):
+        """
+        Grava um ResultadoConciliacao para a conta informada (ACCTID, nome da conta
+        do relatório ou outro identificador estável). Retorna o ID da execução,
+        também guardado em resultado.execucao_historico.
+        Um match com o item do relatório fora do período do extrato (janela de datas,
+        liquidações) mantém o status no item do extrato, sem o par na tabela matches.
+        """
+        datas_extrato = [_data_iso(item["ofx"]["data"]) for item in resultado.resultado
+                         if item["ofx"] is not None and item["ofx"]["data"]]
+        inicio = min(datas_extrato) if datas_extrato else None
+        fim = max(datas_extrato) if datas_extrato else None
+
+        transacoes = {}  # (origem, id) -> [data, centavos, descricao, conta, fitid, status]
+        pares = []
+        for item in resultado.resultado:
+            for origem, chave_id, chave_item in (("extrato", "ofx_id", "ofx"), ("relatorio", "rel_id", "rel")):
+                t = item[chave_item]
+                if t is None or not t["data"] or (origem, item[chave_id]) in transacoes:
+                    continue
+                data = _data_iso(t["data"])
+                if inicio is None or not inicio <= data <= fim:
+                    continue
+                transacoes[(origem, item[chave_id])] = (
+                    data, Conciliador._centavos(t), t.get("descricao") or "",
+                    t.get("conta") or "", t.get("fitid") or "", item["status"]
+                )
+            if item["ofx"] is not None and item["rel"] is not None:
+                pares.append((item["ofx_id"], item["rel_id"], item["status"]))
+
+        estatisticas = resultado.estatisticas
+        with self.conexao:
+            if inicio is not None:
+                self._remover_periodo(conta, inicio, fim)
+            cursor = self.conexao.execute(
+                "INSERT INTO execucoes (criado_em, conta, arquivo_ofx, arquivo_relatorio, data_inicio, data_fim,"
+                " conciliados, nao_conciliados) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (datetime.now().isoformat(timespec="seconds"), conta, arquivo_ofx, arquivo_relatorio,
+                 inicio, fim, estatisticas.get("conciliados"), estatisticas.get("nao_conciliados"))
+            )
+            execucao_id = cursor.lastrowid
+
+            ids_banco = {}
+            for (origem, idx), (data, centavos, descricao, conta_rel, fitid, status) in transacoes.items():
+                cursor = self.conexao.execute(
+                    "INSERT INTO transacoes (execucao_id, conta, origem, data, centavos, descricao,"
+                    " conta_relatorio, fitid, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (execucao_id, conta, origem, data, centavos, descricao, conta_rel, fitid, status)
+                )
+                ids_banco[(origem, idx)] = cursor.lastrowid
+
+            self.conexao.executemany(
+                "INSERT INTO matches (execucao_id, ofx_transacao_id, rel_transacao_id, status) VALUES (?, ?, ?, ?)",
+                [(execucao_id, ids_banco[("extrato", o)], ids_banco[("relatorio", r)], status)
+                 for o, r, status in pares
+                 if ("extrato", o) in ids_banco and ("relatorio", r) in ids_banco]
+            )
+
+            self.conexao.executemany(
+                "INSERT OR REPLACE INTO agregados_diarios (execucao_id, conta, data, total_extrato,"
+                " total_relatorio, status) VALUES (?, ?, ?, ?, ?, ?)",
+                [(execucao_id, conta, _data_iso(row["values"][0]), row["totais"]["extrato"],
+                  row["totais"]["relatorio"], "Conciliado" if row["tag"] == "conciliado" else "Não conciliado")
+                 for row in resultado.linhas_agregado
+                 if inicio is not None and inicio <= _data_iso(row["values"][0]) <= fim]
+            )
+        resultado.execucao_historico = execucao_id
+        return execucao_id
+
+    def registrar_lote(self, resultado_lote, arquivo_relatorio=None):
+        """Grava cada conta de um ResultadoLote. Retorna {conta: ID da execução}."""
+        return {
+            conta: self.registrar(resultado, conta, arquivo_relatorio=arquivo_relatorio)
+            for conta, resultado in resultado_lote.por_conta.items()
+        }
+
+    def _remover_periodo(self, conta, inicio, fim):
+        """
+        Remove transações (e matches, em cascata) e agregados da conta entre inicio e
+        fim ('AAAA-MM-DD', inclusive).
+        Um match entre dias (janela de datas, liquidações) pode ter o outro lado fora
+        do período removido: esse lado volta a 'Não conciliado' se não lhe restar match.
+        """
+        removidas = "SELECT id FROM transacoes WHERE conta = ? AND data BETWEEN ? AND ?"
+        outro_lado = sorted({linha[0] for linha in self.conexao.execute(
+            f"SELECT rel_transacao_id FROM matches WHERE ofx_transacao_id IN ({removidas})"
+            f" UNION SELECT ofx_transacao_id FROM matches WHERE rel_transacao_id IN ({removidas})",
+            [conta, inicio, fim] * 2
+        )})
+        self.conexao.execute("DELETE FROM transacoes WHERE conta = ? AND data BETWEEN ? AND ?", [conta, inicio, fim])
+        self.conexao.execute(
+            "DELETE FROM agregados_diarios WHERE conta = ? AND data BETWEEN ? AND ?", [conta, inicio, fim]
+        )
+        
+        for pos in range(0, len(outro_lado), 500):
+            bloco = outro_lado[pos:pos + 500]
+            marcadores = ",".join("?" * len(bloco))
+            self.conexao.execute(
+                f"UPDATE transacoes SET status = 'Não conciliado' WHERE id IN ({marcadores})"
+                " AND id NOT IN (SELECT ofx_transacao_id FROM matches UNION SELECT rel_transacao_id FROM matches)",
+                bloco
+            )
+
+    # --------------------------------------------------
+    # CONSULTAS
+    # --------------------------------------------------
+    def _consultar(self, sql, parametros):
+        return pd.read_sql_query(sql, self.conexao, params=parametros)
+
+    @staticmethod
+    def _filtros(conta=None, desde=None, ate=None, coluna_data="data"):
+        condicoes, parametros = [], []
+        if conta is not None:
+            condicoes.append("conta = ?")
+            parametros.append(conta)
+        if desde is not None:
+            condicoes.append(f"{coluna_data} >= ?")
+            parametros.append(_data_iso(desde))
+        if ate is not None:
+            condicoes.append(f"{coluna_data} <= ?")
+            parametros.append(_data_iso(ate))
+        return condicoes, parametros
+
+    def contas(self):
+        """Contas presentes no histórico."""
+        return [linha[0] for linha in self.conexao.execute("SELECT DISTINCT conta FROM transacoes ORDER BY conta")]
+
+    def nao_conciliados(self, conta=None, desde=None, ate=None, origem=None):
+        """
+        Transações não conciliadas (extrato e relatório, ou só uma origem),
+        ex.: nao_conciliados("12345-6", desde="2025-01-01").
+        """
+        condicoes, parametros = self._filtros(conta, desde, ate)
+        condicoes.insert(0, "status = 'Não conciliado'")
+        if origem is not None:
+            condicoes.append("origem = ?")
+            parametros.append(origem)
+        return self._consultar(
+            "SELECT conta, origem, data, centavos, descricao, conta_relatorio, fitid FROM transacoes"
+            f" WHERE {' AND '.join(condicoes)} ORDER BY conta, data, origem, id",
+            parametros
+        )
+
+    def buscar_valor(self, centavos, conta=None, desde=None, ate=None, tolerancia=0):
+        """Transações com valor (em centavos) igual ao informado, com tolerância opcional."""
+        condicoes, parametros = self._filtros(conta, desde, ate)
+        condicoes.append("centavos BETWEEN ? AND ?")
+        parametros += [centavos - tolerancia, centavos + tolerancia]
+        return self._consultar(
+            "SELECT conta, origem, data, centavos, descricao, conta_relatorio, fitid, status FROM transacoes"
+            f" WHERE {' AND '.join(condicoes)} ORDER BY data, id",
+            parametros
+        )
+
+    def matches(self, conta=None, desde=None, ate=None):
+        """Pares conciliados (extrato x relatório) no período."""
+        condicoes, parametros = self._filtros(conta, desde, ate, coluna_data="o.data")
+        condicoes = [c.replace("conta = ?", "o.conta = ?") for c in condicoes]
+        where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+        return self._consultar(
+            "SELECT o.conta, o.data AS extrato_data, o.centavos AS extrato_centavos, o.descricao AS extrato_descricao,"
+            " r.data AS relatorio_data, r.centavos AS relatorio_centavos, r.descricao AS relatorio_descricao,"
+            " m.status FROM matches m"
+            " JOIN transacoes o ON o.id = m.ofx_transacao_id"
+            f" JOIN transacoes r ON r.id = m.rel_transacao_id {where}"
+            " ORDER BY o.conta, o.data, o.id",
+            parametros
+        )
+
+    def agregados(self, conta=None, desde=None, ate=None):
+        """Totais diários (em centavos) de extrato e relatório no período."""
+        condicoes, parametros = self._filtros(conta, desde, ate)
+        where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+        return self._consultar(
+            "SELECT conta, data, total_extrato, total_relatorio, total_extrato - total_relatorio AS diferenca,"
+            f" status FROM agregados_diarios {where} ORDER BY conta, data",
+            parametros
+        )
@@ -0,0 +1,76 @@
+import os
+import json
+import tempfile
+from cache_resultados import VERSAO_CACHE, configuracao_motor
+
+
+class EstadoIncremental:
+    """
+    Estado persistido da conciliação incremental de uma conta: para cada dia já
+    conciliado, a impressão digital das transações do dia (extrato e relatório)
+    e os matches encontrados, com as posições das transações dentro do dia.
+
+    Em uma nova execução, o Conciliador só processa os dias cuja impressão mudou
+    ou que ainda não estão no estado. O estado é descartado se a versão da lógica
+    de conciliação, a configuração do motor de somas ou as opções do Conciliador
+    (ex.: janela de datas) forem diferentes.
+    """
+
+    def __init__(self, caminho, motor_soma=None):
+        self.caminho = caminho
+        self.configuracao = configuracao_motor(motor_soma)
+        # Opções do Conciliador (janela de datas etc.) com que os dias foram conciliados
+        self.opcoes = None
+        self.dias = {}
+        self._carregar()
+
+    def _carregar(self):
+        if not os.path.exists(self.caminho):
+            return
+        try:
+            with open(self.caminho, "r", encoding="utf-8") as f:
+                dados = json.load(f)
+        except Exception as e:
+            print(f"Estado incremental ignorado ({self.caminho}): {e}")
+            return
+        if dados.get("versao") == VERSAO_CACHE and dados.get("motor") == self.configuracao:
+            self.opcoes = dados.get("opcoes")
+            self.dias = dados.get("dias", {})
+
+    def usar_opcoes(self, opcoes):
+        """Define as opções do Conciliador; dias conciliados com outras opções são descartados."""
+        if opcoes != self.opcoes:
+            self.dias = {}
+            self.opcoes = opcoes
+
+    def obter(self, dia, impressao):
+        """Matches salvos para o dia (date), se a impressão for a mesma; senão None."""
+        salvo = self.dias.get(dia.isoformat())
+        if salvo and salvo["impressao"] == impressao:
+            return salvo["matches"]
+        return None
+
+    def registrar(self, dia, impressao, matches):
+        """Guarda os matches do dia: lista de (posição no extrato, posição no relatório, status)."""
+        self.dias[dia.isoformat()] = {
+            "impressao": impressao,
+            "matches": [list(match) for match in matches],
+        }
+
+    def salvar(self):
+        """Grava o estado de forma atômica (arquivo temporário + rename)."""
+        pasta = os.path.dirname(os.path.abspath(self.caminho))
+        os.makedirs(pasta, exist_ok=True)
+        descritor, temporario = tempfile.mkstemp(dir=pasta, suffix=".tmp")
+        try:
+            with os.fdopen(descritor, "w", encoding="utf-8") as f:
+                json.dump({
+                    "versao": VERSAO_CACHE,
+                    "motor": self.configuracao,
+                    "opcoes": self.opcoes,
+                    "dias": self.dias,
+                }, f, ensure_ascii=False)
+            os.replace(temporario, self.caminho)
+        except Exception:
+            os.remove(temporario)
+            raise
@@ -4,14 +4,21 @@ import os
 import json
 import io
 import base64
+import hashlib
+import random
 import plotly.express as px
 from datetime import datetime
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4, landscape
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
 from reportlab.lib.styles import getSampleStyleSheet
-from data_loader import ler_ofx, carregar_relatorio_dataframe, converter_dataframe
-from reconciliation import Conciliador
+from data_loader import ler_ofx, identificar_conta_ofx, identificar_contas_ofx, mesclar_ofx, carregar_relatorio_dataframe, carregar_relatorio_em_blocos
+from reconciliation import conciliar, caminho_estado, ObservadorConciliacao
+from moeda import formatar_centavos
+from transacoes import criar_transacoes
+from cache_resultados import CacheResultados, chave_conciliacao
+from incremental import EstadoIncremental
+from historico import HistoricoConciliacao, CAMINHO_HISTORICO
 from styling import colorir_linhas, colorir_linhas_agregado
 
 # Configuração da página
@@ -25,6 +32,13 @@ st.set_page_config(
 # Diretórios
 os.makedirs("profiles", exist_ok=True)
 os.makedirs("assets", exist_ok=True)
+os.makedirs("estado", exist_ok=True)
+
+# Quantos arquivos lidos ficam em cache (compartilhado entre sessões)
+MAX_ARQUIVOS_CACHE = 8
+
+# Resultados de conciliação em disco
+cache_resultados = CacheResultados()
 
 # -----------------------------------------------
 # FUNÇÕES AUXILIARES
@@ -50,6 +64,49 @@ def carregar_logo():
     except Exception as e:
         st.sidebar.title("CONCILIADOR PRO")
 
+# -----------------------------------------------
+# CACHE DOS ARQUIVOS ENVIADOS
+# -----------------------------------------------
+# Cada rerun do Streamlit (qualquer clique em um widget) executaria a leitura dos
+# arquivos de novo. As funções abaixo guardam o resultado pelo hash SHA-256 do
+# conteúdo mais as opções de leitura; o conteúdo em si vai em um parâmetro com
+# "_" para não ser hasheado de novo pelo Streamlit.
+
+def hash_upload(arquivo):
+    """Hash SHA-256 do conteúdo de um arquivo enviado"""
+    return hashlib.sha256(arquivo.getvalue()).hexdigest()
+
+@st.cache_data(max_entries=MAX_ARQUIVOS_CACHE, show_spinner=False)
+def _ler_ofx_em_cache(hash_arquivo, _conteudo):
+    return ler_ofx(io.BytesIO(_conteudo))
+
+@st.cache_data(max_entries=MAX_ARQUIVOS_CACHE, show_spinner=False)
+def _carregar_relatorio_em_cache(hash_arquivo, nome_arquivo, _conteudo):
+    return carregar_relatorio_dataframe(io.BytesIO(_conteudo), nome_arquivo)
+
+@st.cache_data(max_entries=MAX_ARQUIVOS_CACHE, show_spinner=False)
+def _converter_relatorio_em_cache(hash_arquivo, nome_arquivo, mapeamento, tipo_relatorio,
+                                  filtro_conta, dialeto, _conteudo):
+    return carregar_relatorio_em_blocos(
+        io.BytesIO(_conteudo), nome_arquivo, mapeamento, tipo_relatorio,
+        filtro_conta, dialeto=dialeto
+    )
+
+def ler_ofx_upload(arquivo):
+    """Transações do OFX enviado, lidas uma única vez por conteúdo"""
+    return _ler_ofx_em_cache(hash_upload(arquivo), arquivo.getvalue())
+
+def carregar_relatorio_upload(arquivo):
+    """Relatório bruto (para o mapeamento), lido uma única vez por conteúdo"""
+    return _carregar_relatorio_em_cache(hash_upload(arquivo), arquivo.name, arquivo.getvalue())
+
+def converter_relatorio_upload(arquivo, mapeamento, tipo_relatorio, filtro_conta, dialeto):
+    """Relatório convertido, em cache pelo conteúdo, mapeamento, formato, conta e dialeto"""
+    return _converter_relatorio_em_cache(
+        hash_upload(arquivo), arquivo.name, dict(mapeamento), tipo_relatorio,
+        filtro_conta, dialeto, arquivo.getvalue()
+    )
+
 def inicializar_sessao():
     """Inicializa variáveis de sessão"""
     session_defaults = {
@@ -58,7 +115,9 @@ def inicializar_sessao():
             'conta': None, 'natureza': None, 'receita': None, 'despesa': None
         },
         'tipo_relatorio': "Única coluna com Natureza (C/D)",
-        'filtros_status': ["Conciliado", "Conciliado (Soma)", "Não conciliado"],
+        'dialeto_csv': None,
+        'filtros_status': ["Conciliado", "Conciliado (Soma)", "Conciliado (Liquidação)", "Sugerido (Descrição)",
+                           "Não conciliado"],
         'df_resultado': None,
         'df_agregado': None,
         'df_diario': None,
@@ -81,6 +140,77 @@ def atualizar_filtros():
         
         st.session_state.df_filtrado = df_filtrado
 
+class ObservadorStreamlit(ObservadorConciliacao):
+    """Exibe o andamento e o resumo da conciliação na página"""
+
+    MENSAGENS = [
+        "🔄 Comparando padrões de transações...",
+        "🧮 Calculando correspondências exatas...",
+        "🔍 Buscando combinações de valores...",
+        "📅 Analisando datas e valores...",
+        "🧩 Verificando possíveis agrupamentos...",
+        "⚙️ Processando algoritmos de conciliação...",
+        "📊 Aplicando análise estatística...",
+        "🤖 IA trabalhando na conciliação..."
+    ]
+
+    def inicio(self, total_ofx, total_rel):
+        st.write("🔍 IA iniciando análise de transações...")
+        st.write(f"📊 Processando {total_ofx} transações do extrato bancário")
+        st.write(f"📋 Comparando com {total_rel} lançamentos do relatório")
+        self.progress_bar = st.progress(0)
+        self.status_text = st.empty()
+
+    def etapa(self, texto):
+        self.status_text.write(texto)
+
+    def progresso(self, percentual):
+        self.progress_bar.progress(percentual)
+
+    def transacao(self, posicao, ofx_item, centavos):
+        # Mensagens dinâmicas a cada 5 transações, detalhes da transação a cada 10
+        if posicao % 5 == 0:
+            self.status_text.write(random.choice(self.MENSAGENS))
+        if posicao % 10 == 0:
+            data_str = ofx_item["data"].strftime('%d/%m/%Y') if ofx_item["data"] else "N/A"
+            self.status_text.write(f"💱 Analisando transação de {data_str}: {formatar_centavos(abs(centavos))}")
+
+    def fim(self, estatisticas):
+        st.write(f"✨ Conciliação finalizada! Taxa de sucesso: {estatisticas['taxa_conciliacao']:.1f}%")
+        st.write(f"✓ {estatisticas['conciliados']} transações conciliadas | ✗ {estatisticas['nao_conciliados']} não conciliadas")
+        if estatisticas.get("sugeridos"):
+            st.write(f"🔤 {estatisticas['sugeridos']} sugestões pela descrição para revisar")
+
+        # Resumo dos dias conciliados
+        total_dias = estatisticas["total_dias"]
+        dias_conciliados = estatisticas["dias_conciliados"]
+        diferenca_total = estatisticas["diferenca_total"]
+        st.markdown("### 📆 Resumo por Dias")
+        
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric(
+                label="Dias Conciliados", 
+                value=f"{dias_conciliados}/{total_dias}",
+                delta=f"{(dias_conciliados/total_dias*100):.1f}%" if total_dias > 0 else "0%"
+            )
+        with col2:
+            st.metric(
+                label="Total Extrato", 
+                value=formatar_centavos(estatisticas["total_extrato"])
+            )
+        with col3:
+            st.metric(
+                label="Total Relatório", 
+                value=formatar_centavos(estatisticas["total_relatorio"]),
+                delta=f"Diferença: {formatar_centavos(diferenca_total)}",
+                delta_color="inverse" if diferenca_total > 0 else "normal"
+            )
+        
+        # Listar dias com problemas se houver
+        if estatisticas["dias_problema"]:
+            st.warning(f"⚠️ Dias com diferenças: {', '.join(estatisticas['dias_problema'])}")
+
 # -----------------------------------------------
 # GERENCIAMENTO DE PERFIS
 # -----------------------------------------------
@@ -124,7 +254,8 @@ def salvar_perfil(nome):
     """Salva as configurações atuais em um perfil"""
     perfil = {
         "mapeamento": st.session_state.colunas_mapeadas,
-        "tipo_relatorio": st.session_state.tipo_relatorio
+        "tipo_relatorio": st.session_state.tipo_relatorio,
+        "dialeto": st.session_state.dialeto_csv
     }
     with open(os.path.join("profiles", f"{nome}.json"), "w") as f:
         json.dump(perfil, f)
@@ -135,6 +266,7 @@ def carregar_perfil(nome):
         perfil = json.load(f)
     st.session_state.colunas_mapeadas = perfil["mapeamento"]
     st.session_state.tipo_relatorio = perfil["tipo_relatorio"]
+    st.session_state.dialeto_csv = perfil.get("dialeto")
     st.sidebar.success("Perfil carregado!")
 
 # -----------------------------------------------
@@ -149,7 +281,8 @@ def main():
     # Filtros dinâmicos
     st.sidebar.markdown("---")
     st.sidebar.subheader("🔍 Filtros de Status")
-    status_opcoes = ["Conciliado", "Conciliado (Soma)", "Não conciliado"]
+    status_opcoes = ["Conciliado", "Conciliado (Soma)", "Conciliado (Liquidação)", "Sugerido (Descrição)",
+                     "Não conciliado"]
     for status in status_opcoes:
         key = f"filter_{status}"
         if st.sidebar.checkbox(status, key=key, value=status in st.session_state.filtros_status):
@@ -162,6 +295,68 @@ def main():
     # Botão para atualizar filtros
     if st.sidebar.button("🔄 Atualizar Filtros", use_container_width=True):
         atualizar_filtros()
+    
+    # Processamento paralelo por dia (útil em extratos longos)
+    st.sidebar.markdown("---")
+    processos = st.sidebar.number_input(
+        "⚙️ Processos em paralelo",
+        min_value=1,
+        max_value=os.cpu_count() or 1,
+        value=1,
+        help="Concilia os dias do extrato em paralelo, usando mais núcleos do processador"
+    )
+    janela_dias = st.sidebar.number_input(
+        "📆 Tolerância de datas (dias úteis)",
+        min_value=0,
+        max_value=10,
+        value=0,
+        help="Aceita lançamentos do relatório até N dias úteis antes ou depois da data do extrato "
+             "(boletos, TEDs no fim de semana, cartões). Os matches no mesmo dia continuam tendo prioridade."
+    )
+    janela_liquidacao = st.sidebar.number_input(
+        "💳 Liquidação de recebíveis (dias úteis)",
+        min_value=0,
+        max_value=30,
+        value=0,
+        help="Procura créditos do extrato que pagam vários recebíveis do relatório lançados até N dias úteis "
+             "antes (adquirentes de cartão, gateways de pagamento). 0 desliga."
+    )
+    filtro_liquidacao = st.sidebar.text_input(
+        "Palavras dos recebíveis (opcional)",
+        value="",
+        help="Ex.: cielo, rede, stone. Só recebíveis com uma destas palavras na descrição ou na conta "
+             "entram nas liquidações",
+        disabled=not janela_liquidacao
+    )
+    filtro_liquidacao = [p.strip() for p in filtro_liquidacao.split(",") if p.strip()]
+    usar_descricoes = st.sidebar.checkbox(
+        "🔤 Usar descrições",
+        value=False,
+        help="Desempata lançamentos de mesmo valor pela descrição mais parecida com a do extrato e sugere "
+             "pares de valor próximo e descrição parecida (status 'Sugerido (Descrição)', para revisão)"
+    )
+    atribuicao_otima = st.sidebar.checkbox(
+        "🧩 Atribuição ótima por dia",
+        value=False,
+        help="Casa primeiro todos os valores exatos do dia e depois escolhe as somas sem conflito entre si, "
+             "em vez de seguir a ordem das linhas do extrato (o resultado depende menos dessa ordem)"
+    )
+    modo_incremental = st.sidebar.checkbox(
+        "📅 Modo incremental",
+        value=False,
+        help="Guarda o resultado de cada dia por conta e, nos próximos envios, concilia apenas os dias novos ou alterados"
+    )
+    usar_cache = st.sidebar.checkbox(
+        "♻️ Reutilizar resultados anteriores",
+        value=True,
+        help="Arquivos, perfil e conta idênticos a uma execução anterior abrem o resultado salvo em disco "
+             "(fora do modo incremental, que reaproveita os dias conciliados)"
+    )
+    salvar_historico = st.sidebar.checkbox(
+        "🗄️ Salvar no histórico",
+        value=True,
+        help="Grava transações, matches e totais diários no histórico local (SQLite) para consultas futuras"
+    )
     # Conteúdo principal
     st.markdown('<div id="inicio"></div>', unsafe_allow_html=True)
     st.title("CONCILIAÇÃO BANCÁRIA AUTOMÁTICA POR IA")
@@ -169,15 +364,22 @@ def main():
     # Upload de arquivos
     col1, col2 = st.columns(2)
     with col1:
-        ofx_file = st.file_uploader("Arquivo OFX/Bancário", type=["ofx"])
+        ofx_files = st.file_uploader(
+            "Arquivo(s) OFX/Bancário",
+            type=["ofx"],
+            accept_multiple_files=True,
+            help="Vários extratos da mesma conta (inclusive com períodos sobrepostos) são unidos sem duplicidades"
+        )
     with col2:
         rel_file = st.file_uploader("Relatório ERP/Financeiro", type=["csv"])
     
     # Configuração do mapeamento
     if rel_file:
         try:
-            df_rel = carregar_relatorio_dataframe(rel_file, rel_file.name)
+            df_rel = carregar_relatorio_upload(rel_file)
             colunas = df_rel.columns.tolist()
+            # Dialeto detectado do CSV (encoding, delimitador, decimal, cabeçalho), salvo com o perfil
+            st.session_state.dialeto_csv = df_rel.attrs.get('dialeto')
             
             st.markdown("### 🔧 Configuração do Mapeamento")
             
@@ -223,99 +425,108 @@ def main():
 
     # Execução da conciliação
     if st.button("▶️ EXECUTAR CONCILIAÇÃO", use_container_width=False):
-        if ofx_file and rel_file:
+        if ofx_files and rel_file:
             with st.spinner("Processando..."):
                 try:
-                    # Carregar dados
-                    trans_ofx = ler_ofx(ofx_file)
-                    df_rel = carregar_relatorio_dataframe(rel_file, rel_file.name)
-                    
-                    # Filtrar linhas com Natureza válida
-                    df_rel = df_rel[df_rel[st.session_state.colunas_mapeadas['natureza']].isin(['C', 'D'])]
-
-                    trans_rel = converter_dataframe(
-                        df_rel,
+                    # Resultado de uma execução idêntica anterior (mesmos arquivos, perfil e motor)
+                    chave_resultado = chave_conciliacao(
+                        [hash_upload(f) for f in ofx_files] + [hash_upload(rel_file)],
                         st.session_state.colunas_mapeadas,
                         st.session_state.tipo_relatorio,
-                        conta_filtro if conta_filtro else None
+                        conta_filtro if conta_filtro else None,
+                        st.session_state.dialeto_csv,
+                        opcoes={"paralelo": processos > 1, "janela_dias": janela_dias,
+                                "usar_descricoes": usar_descricoes, "atribuicao_otima": atribuicao_otima,
+                                "janela_liquidacao": janela_liquidacao, "filtro_liquidacao": filtro_liquidacao}
                     )
+                    # No modo incremental o estado por dia já faz o reaproveitamento: um acerto do
+                    # cache pularia a gravação do estado e a próxima execução começaria do zero
+                    reutilizar = usar_cache and not modo_incremental
+                    resultado = cache_resultados.obter(chave_resultado) if reutilizar else None
+                    gravar_cache = resultado is None
                     
-                    # Processar conciliação
-                    conciliador = Conciliador(trans_ofx, trans_rel)
-                    df_resultado = conciliador.executar()
+                    if resultado is not None:
+                        st.info("♻️ Resultado recuperado do cache (arquivos e perfil idênticos a uma execução anterior)")
+                        ObservadorStreamlit().fim(resultado.estatisticas)
+                    else:
+                        # Carregar dados (vários OFX são unidos sem transações duplicadas)
+                        for f in ofx_files:
+                            contas_arquivo = identificar_contas_ofx(f)
+                            if len(contas_arquivo) > 1:
+                                st.warning(
+                                    f"⚠️ {f.name} tem extratos de {len(contas_arquivo)} contas: só o da conta "
+                                    f"{contas_arquivo[0]} é conciliado (use o modo em lote da linha de comando)"
+                                )
+                        if len(ofx_files) > 1:
+                            contas_ofx = {identificar_conta_ofx(f) for f in ofx_files} - {""}
+                            if len(contas_ofx) > 1:
+                                st.warning(f"⚠️ Os extratos enviados são de contas diferentes: {', '.join(sorted(contas_ofx))}")
+                            trans_ofx, duplicadas = mesclar_ofx([ler_ofx_upload(f) for f in ofx_files])
+                            if duplicadas:
+                                st.info(f"🔗 {len(ofx_files)} extratos unidos: {duplicadas} transação(ões) repetida(s) descartada(s)")
+                        else:
+                            trans_ofx = ler_ofx_upload(ofx_files[0])
+                        # Relatório lido e convertido em blocos (filtros de natureza C/D e conta por bloco)
+                        df_trans_rel = converter_relatorio_upload(
+                            rel_file,
+                            st.session_state.colunas_mapeadas,
+                            st.session_state.tipo_relatorio,
+                            conta_filtro if conta_filtro else None,
+                            st.session_state.dialeto_csv
+                        )
+                        trans_rel = criar_transacoes(df_trans_rel)
+                        
+                        # Estado incremental por conta do extrato (ACCTID) e filtro de conta
+                        estado = None
+                        if modo_incremental:
+                            estado = EstadoIncremental(caminho_estado(
+                                "estado", identificar_conta_ofx(ofx_files[0]) or "extrato", conta_filtro or "todas"
+                            ))
+                        
+                        # Processar conciliação
+                        resultado = conciliar(
+                            trans_ofx, trans_rel,
+                            observador=ObservadorStreamlit(),
+                            df_relatorio=df_trans_rel,
+                            processos=processos,
+                            estado=estado,
+                            janela_dias=janela_dias,
+                            usar_descricoes=usar_descricoes,
+                            atribuicao_otima=atribuicao_otima,
+                            janela_liquidacao=janela_liquidacao,
+                            filtro_liquidacao=filtro_liquidacao
+                        )
+                        if resultado.estatisticas["dias_reaproveitados"]:
+                            st.info(
+                                f"📅 Modo incremental: {resultado.estatisticas['dias_processados']} dia(s) conciliado(s), "
+                                f"{resultado.estatisticas['dias_reaproveitados']} reaproveitado(s) de execuções anteriores"
+                            )
                     
-                    # Gerar dados para agregação
-                    rows_aux = [{
-                        "values": [
-                            row["Extrato Data"],
-                            row["Extrato Valor"],
-                            row["Extrato Descrição"],
-                            row["Relatório Data"],
-                            row["Relatório Valor"],
-                            row["Relatório Descrição"],
-                            row["Status"]
-                        ],
-                        "tag": ""
-                    } for _, row in df_resultado.iterrows()]
+                    # Histórico pela conta do extrato (ACCTID), com ou sem filtro de conta, para que
+                    # a execução mais recente de cada dia substitua a anterior. Um resultado do cache
+                    # que já foi gravado não é gravado de novo.
+                    if salvar_historico and getattr(resultado, "execucao_historico", None) is None:
+                        with HistoricoConciliacao() as historico:
+                            historico.registrar(
+                                resultado,
+                                identificar_conta_ofx(ofx_files[0]) or ofx_files[0].name,
+                                arquivo_ofx=", ".join(f.name for f in ofx_files),
+                                arquivo_relatorio=rel_file.name
+                            )
+                        gravar_cache = True
+                    if reutilizar and gravar_cache:
+                        cache_resultados.salvar(chave_resultado, resultado)
+                    df_resultado = resultado.detalhes
                     
-                    # Processar dados para gráfico
-                    try:
-                        df_diario = pd.DataFrame(trans_rel)
-                        if not df_diario.empty:
-                            # Converter a coluna 'data' para datetime e extrair somente a data
-                            df_diario['data'] = pd.to_datetime(df_diario['data']).dt.date
-                            
-                            # Agrupar os dados por dia (apenas dias com movimentação serão mantidos)
-                            df_diario = df_diario.groupby('data').agg({
-                                'receita': 'sum',
-                                'despesa': 'sum'
-                            }).reset_index()
-                            
-                            # Converter as datas para o formato "dd/mm/aaaa"
-                            df_diario['data'] = df_diario['data'].apply(lambda d: d.strftime("%d/%m/%Y"))
-                            
-                            st.session_state.df_diario = df_diario
-                    except Exception as chart_error:
-                        st.error(f"Erro ao processar dados para gráfico: {str(chart_error)}")
+                    # Dados para gráfico
+                    if not resultado.diario.empty:
+                        st.session_state.df_diario = resultado.diario
                     
                     # Armazenar resultados
                     st.session_state.df_resultado = df_resultado
                     st.session_state.df_filtrado = df_resultado[df_resultado['Status'].isin(st.session_state.filtros_status)]
-                    st.session_state.aggregator_rows = conciliador.agrupar_por_dia(rows_aux)
-                    # Adicionar diferença para dias não conciliados
-                    for row in st.session_state.aggregator_rows:
-                        if row["values"][6] == "Não conciliado":
-                            # Converter valores para float, tratando possíveis strings ou valores nulos
-                            try:
-                                extrato_valor = float(str(row["values"][1]).replace("R$", "").replace(".", "").replace(",", ".").strip()) if row["values"][1] else 0
-                            except (ValueError, TypeError):
-                                extrato_valor = 0
-                                
-                            try:
-                                relatorio_valor = float(str(row["values"][4]).replace("R$", "").replace(".", "").replace(",", ".").strip()) if row["values"][4] else 0
-                            except (ValueError, TypeError):
-                                relatorio_valor = 0
-                                
-                            diferenca = extrato_valor - relatorio_valor
-                            # Atualizar status com a diferença
-                            row["values"][6] = f"Não conciliado (Diferença: R$ {diferenca:.2f})"
-                            row["tag"] = "nao_conciliado"
-                        elif row["values"][6] == "Conciliado":
-                            row["tag"] = "conciliado"
-                        elif row["values"][6] == "Conciliado (Soma)":
-                            row["tag"] = "conciliado_soma"
-                    st.session_state.df_agregado = pd.DataFrame(
-                        [r["values"] for r in st.session_state.aggregator_rows],
-                        columns=[
-                            "Período", 
-                            "Total Extrato", 
-                            " ",
-                            "Data Relatório", 
-                            "Total Relatório", 
-                            "  ",
-                            "Status"
-                        ]
-                    )
+                    st.session_state.aggregator_rows = resultado.linhas_agregado
+                    st.session_state.df_agregado = resultado.agregado
                     
                     st.success("✅ Conciliação concluída com sucesso!")
                 
@@ -604,10 +815,14 @@ def main():
                         status_idx = df_display.columns.get_loc(status_col)
                         status = row[status_idx]
                         
-                        if "Conciliado" in str(status) and "Soma" not in str(status):
+                        if "Conciliado (Liquidação)" in str(status):
+                            style.append(('BACKGROUND', (0, i), (-1, i), colors.lavender))
+                        elif "Conciliado" in str(status) and "Soma" not in str(status):
                             style.append(('BACKGROUND', (0, i), (-1, i), colors.lightgreen))
                         elif "Conciliado (Soma)" in str(status):
                             style.append(('BACKGROUND', (0, i), (-1, i), colors.lightblue))
+                        elif "Sugerido" in str(status):
+                            style.append(('BACKGROUND', (0, i), (-1, i), colors.moccasin))
                         elif "Não conciliado" in str(status):
                             style.append(('BACKGROUND', (0, i), (-1, i), colors.mistyrose))
                 
@@ -638,13 +853,41 @@ def main():
                 use_container_width=True
             )
 
+    # Consulta ao histórico de conciliações
+    if os.path.exists(CAMINHO_HISTORICO):
+        with st.expander("🗄️ Histórico de Conciliações", expanded=False):
+            with HistoricoConciliacao() as historico:
+                contas_historico = historico.contas()
+                if contas_historico:
+                    col1, col2, col3 = st.columns(3)
+                    with col1:
+                        conta_historico = st.selectbox("Conta", contas_historico, key="historico_conta")
+                    with col2:
+                        desde_historico = st.date_input("Desde", value=None, key="historico_desde", format="DD/MM/YYYY")
+                    with col3:
+                        origem_historico = st.selectbox(
+                            "Origem", ["Extrato e Relatório", "Extrato", "Relatório"], key="historico_origem"
+                        )
+                    origem = {"Extrato": "extrato", "Relatório": "relatorio"}.get(origem_historico)
+                    pendentes = historico.nao_conciliados(conta_historico, desde_historico, origem=origem)
+                    st.markdown(f"**{len(pendentes)} transações não conciliadas**")
+                    if not pendentes.empty:
+                        pendentes["data"] = pd.to_datetime(pendentes["data"]).dt.strftime("%d/%m/%Y")
+                        pendentes["valor"] = pendentes["centavos"].apply(formatar_centavos)
+                        st.dataframe(
+                            pendentes[["data", "origem", "valor", "descricao", "conta_relatorio", "fitid"]],
+                            use_container_width=True, hide_index=True
+                        )
+                else:
+                    st.info("Nenhuma conciliação gravada no histórico ainda.")
+
     # Seções informativas
     st.markdown("---")
     st.markdown('<div id="instrucoes"></div>', unsafe_allow_html=True)
     st.markdown("## 📑 Instruções")
     st.markdown("""
     **Guia Rápido:**
-    1. Carregue o arquivo .OFX (extrato bancário)
+    1. Carregue o(s) arquivo(s) .OFX (extrato bancário; vários extratos da mesma conta são unidos)
     2. Carregue o relatório do sistema (.CSV)
     3. Configure o mapeamento das colunas
     4. Execute a conciliação
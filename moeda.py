@@ -0,0 +1,44 @@
+import numpy as np
+from decimal import Decimal, ROUND_HALF_UP, InvalidOperation
+
+_UM_CENTAVO = Decimal("0.01")
+
+
+def para_centavos(valor):
+    """
+    Converte um valor monetário em reais (Decimal, str, int ou float)
+    para um inteiro de centavos, arredondando meio centavo para cima.
+    A conversão passa por Decimal para evitar erros de representação do float.
+    """
+    if isinstance(valor, Decimal):
+        decimal = valor
+    else:
+        try:
+            decimal = Decimal(str(valor).strip())
+        except InvalidOperation:
+            raise ValueError(f"Valor monetário inválido: {valor!r}")
+    return int(decimal.quantize(_UM_CENTAVO, rounding=ROUND_HALF_UP) * 100)
+
+
+def centavos_para_reais(centavos):
+    """Converte centavos inteiros para float em reais (apenas para exibição e gráficos)."""
+    return centavos / 100
+
+
+def formatar_centavos(centavos):
+    """
+    Formata centavos no padrão usado nas tabelas: 'R$ 1234,56' / 'R$ -1234,56'.
+    """
+    sinal = "-" if centavos < 0 else ""
+    reais, resto = divmod(abs(centavos), 100)
+    return f"R$ {sinal}{reais},{resto:02d}"
+
+
+def serie_para_centavos(valores):
+    """
+    Versão vetorizada de para_centavos para uma Series/array de floats em reais.
+    Arredonda meio centavo para cima (em módulo); a pequena folga compensa
+    a representação binária de valores como 1.005. Valores ausentes (NaN) viram 0.
+    """
+    valores = np.nan_to_num(np.asarray(valores, dtype=float))
+    return (np.sign(valores) * np.floor(np.abs(valores) * 100 + 0.5 + 1e-9)).astype('int64')
@@ -0,0 +1,145 @@
+import re
+import html
+from decimal import Decimal, InvalidOperation
+from datetime import datetime
+from moeda import para_centavos
+from transacoes import Transacao
+
+# Tamanho do trecho inicial onde ficam os cabeçalhos OFX (SGML ou XML)
+TAMANHO_CABECALHO_OFX = 4096
+
+_CHARSETS_OFX = {
+    '1252': 'cp1252',
+    'WINDOWS-1252': 'cp1252',
+    'ISO-8859-1': 'latin1',
+    '8859-1': 'latin1',
+    'ISO8859-1': 'latin1',
+    'LATIN1': 'latin1',
+    'UTF-8': 'utf-8',
+    'UTF8': 'utf-8',
+}
+
+_BLOCO_STMTTRN = re.compile(r'<STMTTRN>(.*?)(?:</STMTTRN>|(?=<STMTTRN>)|(?=</BANKTRANLIST>))', re.S | re.I)
+_CAMPO_SGML = re.compile(r'<([A-Z0-9.]+)>([^<\r\n]*)', re.I)
+_ACCTID = re.compile(r'<ACCTID>([^<\r\n]*)', re.I)
+# Um extrato por conta: <STMTRS> (conta corrente) ou <CCSTMTRS> (cartão de crédito)
+_BLOCO_EXTRATO = re.compile(r'<(STMTRS|CCSTMTRS)>(.*?)(?:</\1>|(?=<(?:STMTRS|CCSTMTRS)>)|$)', re.S | re.I)
+
+
+def detectar_charset_ofx(conteudo):
+    """
+    Determina o encoding do arquivo a partir do cabeçalho OFX:
+    CHARSET/ENCODING no cabeçalho SGML (OFX 1.x) ou encoding="..." no XML (OFX 2.x).
+    Sem indicação clara, usa UTF-8 se o conteúdo for UTF-8 válido, senão cp1252.
+    """
+    cabecalho = conteudo[:TAMANHO_CABECALHO_OFX].decode('ascii', errors='ignore').upper()
+
+    xml = re.search(r'<\?XML[^>]*ENCODING="([^"]+)"', cabecalho)
+    if xml and xml.group(1) in _CHARSETS_OFX:
+        return _CHARSETS_OFX[xml.group(1)]
+
+    charset = re.search(r'CHARSET:\s*([\w-]+)', cabecalho)
+    if charset and charset.group(1) in _CHARSETS_OFX:
+        return _CHARSETS_OFX[charset.group(1)]
+
+    encoding = re.search(r'ENCODING:\s*([\w-]+)', cabecalho)
+    if encoding and encoding.group(1) in _CHARSETS_OFX:
+        return _CHARSETS_OFX[encoding.group(1)]
+
+    # USASCII/CHARSET:NONE é comum em bancos que, na prática, gravam acentos em cp1252
+    try:
+        conteudo.decode('utf-8')
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'cp1252'
+
+
+def _converter_data_ofx(texto):
+    """
+    Converte datas OFX (AAAAMMDD[HHMMSS[.XXX]][[-3:BRT]]) para datetime no horário local
+    do extrato, ignorando o fuso informado.
+    """
+    digitos = re.match(r'\d+', texto.strip())
+    if not digitos or len(digitos.group()) < 8:
+        return None
+    d = digitos.group()
+    return datetime(
+        int(d[0:4]), int(d[4:6]), int(d[6:8]),
+        int(d[8:10] or 0), int(d[10:12] or 0), int(d[12:14] or 0)
+    )
+
+
+def _converter_valor_ofx(texto):
+    """Converte TRNAMT para Decimal, aceitando vírgula decimal usada por alguns bancos."""
+    texto = texto.strip().replace(' ', '')
+    if ',' in texto and '.' not in texto:
+        texto = texto.replace(',', '.')
+    return Decimal(texto)
+
+
+def _extratos(texto):
+    """
+    Separa o OFX em extratos (<STMTRS>/<CCSTMTRS>), cada um com o seu ACCTID:
+    lista de (conta, trecho). Sem esses blocos, o arquivo inteiro é um extrato só.
+    """
+    blocos = [bloco.group(2) for bloco in _BLOCO_EXTRATO.finditer(texto)] or [texto]
+    extratos = []
+    for bloco in blocos:
+        conta = _ACCTID.search(bloco)
+        extratos.append((html.unescape(conta.group(1).strip()) if conta else '', bloco))
+    return extratos
+
+
+def listar_contas_ofx(conteudo):
+    """Retorna o ACCTID de cada extrato do OFX, na ordem do arquivo ('' se não informado)."""
+    texto = conteudo.decode(detectar_charset_ofx(conteudo), errors='replace')
+    return [conta for conta, _ in _extratos(texto)]
+
+
+def extrair_conta_ofx(conteudo):
+    """
+    Retorna o ACCTID (conta do extrato, como está no arquivo) do primeiro extrato
+    do OFX, ou '' se o arquivo não informar a conta.
+    """
+    return listar_contas_ofx(conteudo)[0]
+
+
+def iterar_transacoes_ofx(conteudo, conta=None):
+    """
+    Percorre os blocos <STMTTRN> de um extrato do OFX (SGML ou XML) e gera as transações
+    uma a uma como Transacao (data, valor, centavos, descricao, fitid), com IDs sequenciais.
+    conta escolhe o extrato pelo ACCTID, em arquivos com várias contas; sem ela, é lido
+    o primeiro extrato (como no ofxparse). Levanta ValueError se a conta não estiver
+    no arquivo ou em blocos inválidos.
+    O conteúdo é decodificado uma única vez, com o charset indicado no cabeçalho,
+    preservando os acentos da descrição.
+    """
+    texto = conteudo.decode(detectar_charset_ofx(conteudo), errors='replace')
+    extratos = _extratos(texto)
+    if conta is not None:
+        extratos = [extrato for extrato in extratos if extrato[0] == conta]
+        if not extratos:
+            raise ValueError(f"Conta {conta} não encontrada no OFX")
+    trecho = extratos[0][1]
+
+    for pos, bloco in enumerate(_BLOCO_STMTTRN.finditer(trecho)):
+        campos = {}
+        for tag, valor in _CAMPO_SGML.findall(bloco.group(1)):
+            campos.setdefault(tag.upper(), html.unescape(valor.strip()))
+
+        data = _converter_data_ofx(campos.get('DTPOSTED', ''))
+        if data is None or 'TRNAMT' not in campos:
+            raise ValueError(f"Transação OFX sem data ou valor: {campos.get('FITID', '')}")
+        try:
+            valor = _converter_valor_ofx(campos['TRNAMT'])
+        except InvalidOperation:
+            raise ValueError(f"Valor OFX inválido: {campos['TRNAMT']!r}")
+
+        yield Transacao(
+            data=data,
+            valor=float(valor),
+            centavos=para_centavos(valor),
+            descricao=campos.get('MEMO') or campos.get('NAME') or '',
+            fitid=campos.get('FITID', ''),
+            id=pos
+        )
@@ -1,21 +1,363 @@
 import re
+import os
+import copy
+import hashlib
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
-import streamlit as st
-from datetime import datetime
-from itertools import combinations
+from datetime import datetime, date
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter, deque
+from moeda import para_centavos, formatar_centavos, centavos_para_reais
+from transacoes import criar_transacoes
+from incremental import EstadoIncremental
+from similaridade import IndiceDescricoes, normalizar
+
+class MotorSomaSubconjuntos:
+    """
+    Motor de busca de subconjuntos cuja soma, em centavos, é igual a um valor alvo.
+
+    Usa meet-in-the-middle: as somas das combinações de metade do tamanho do grupo
+    ficam em uma tabela hash e a outra metade é procurada nela, com poda pelos
+    valores ordenados. Grupos menores são tentados primeiro. O motor pode ser
+    substituído no Conciliador por qualquer objeto com o mesmo método `buscar`.
+    """
+
+    def __init__(self, max_itens=4, tempo_limite=0.5):
+        """
+        max_itens: tamanho máximo do grupo somado.
+        tempo_limite: tempo máximo, em segundos, de cada busca (None = sem limite).
+        """
+        self.max_itens = max_itens
+        self.tempo_limite = tempo_limite
+        # Quantas buscas foram interrompidas pelo limite de tempo
+        self.buscas_interrompidas = 0
+
+    def configuracao(self):
+        """Parâmetros que influenciam o resultado (usados na chave do cache de resultados)."""
+        return {"max_itens": self.max_itens, "tempo_limite": self.tempo_limite}
+
+    def buscar(self, itens, alvo, min_itens=2):
+        """
+        itens: lista de (id, centavos), todos com o mesmo sinal do alvo.
+        alvo: valor em centavos a ser atingido.
+        Retorna a lista de IDs do grupo encontrado (na ordem de entrada) ou None.
+        """
+        if not alvo:
+            return None
+        # Trabalhar com valores absolutos; itens maiores que o alvo nunca participam
+        sinal = 1 if alvo > 0 else -1
+        alvo = abs(alvo)
+        valores = []
+        for pos, (item_id, centavos) in enumerate(itens):
+            centavos *= sinal
+            if 0 < centavos <= alvo:
+                valores.append((centavos, pos, item_id))
+        valores.sort()
+
+        prazo = time.perf_counter() + self.tempo_limite if self.tempo_limite else None
+        somente_valores = [v[0] for v in valores]
+        tabelas = {}  # Tabelas de somas reaproveitadas entre tamanhos de grupo
+        try:
+            for tamanho in range(min_itens, min(self.max_itens, len(valores)) + 1):
+                grupo = self._buscar_tamanho(somente_valores, alvo, tamanho, prazo, tabelas)
+                if grupo:
+                    escolhidos = sorted((valores[i][1], valores[i][2]) for i in grupo)
+                    return [item_id for _, item_id in escolhidos]
+        except TimeoutError:
+            self.buscas_interrompidas += 1
+        return None
+
+    def _buscar_tamanho(self, valores, alvo, tamanho, prazo, tabelas):
+        """
+        Procura `tamanho` posições distintas de `valores` (ordenados) com soma igual ao alvo.
+        Retorna a tupla de posições ou None.
+        """
+        if tamanho == 1:
+            return next(((i,) for i, v in enumerate(valores) if v == alvo), None)
+        metade_a = tamanho // 2
+        metade_b = tamanho - metade_a
+
+        # Para cada soma da metade B guarda-se a combinação de maior primeira posição:
+        # basta ela para saber se existe uma combinação inteiramente após a metade A.
+        tabela = tabelas.get(metade_b)
+        if tabela is None:
+            tabela = tabelas[metade_b] = {}
+            for soma, combo in self._combinacoes_limitadas(valores, metade_b, alvo, prazo):
+                atual = tabela.get(soma)
+                if atual is None or combo[0] > atual[0]:
+                    tabela[soma] = combo
+
+        for soma, combo in self._combinacoes_limitadas(valores, metade_a, alvo, prazo):
+            complemento = tabela.get(alvo - soma)
+            if complemento is not None and complemento[0] > combo[-1]:
+                return combo + complemento
+        return None
+
+    @staticmethod
+    def _combinacoes_limitadas(valores, tamanho, limite, prazo):
+        """
+        Gera (soma, posições) das combinações de `tamanho` itens de `valores` (ordenados)
+        cuja soma não passa do limite, abandonando ramos que já não cabem.
+        """
+        n = len(valores)
+        acumulado = [0]
+        for v in valores:
+            acumulado.append(acumulado[-1] + v)
+        contador = 0
+
+        def expandir(inicio, faltam, soma, prefixo):
+            nonlocal contador
+            for i in range(inicio, n - faltam + 1):
+                # Menor soma possível completando com os próximos itens a partir de i
+                if soma + acumulado[i + faltam] - acumulado[i] > limite:
+                    break
+                contador += 1
+                if prazo and contador % 1024 == 0 and time.perf_counter() > prazo:
+                    raise TimeoutError
+                if faltam == 1:
+                    yield soma + valores[i], prefixo + (i,)
+                else:
+                    yield from expandir(i + 1, faltam - 1, soma + valores[i], prefixo + (i,))
+
+        yield from expandir(0, tamanho, 0, ())
+
+
+# Referência para numerar os dias úteis (só as diferenças entre números importam)
+_DATA_BASE_DIAS_UTEIS = date(2000, 1, 3)
+
+# Sugestões por descrição: similaridade mínima e diferença máxima de valor (fração do valor do extrato)
+LIMIAR_SUGESTAO = 0.6
+TOLERANCIA_SUGESTAO = 0.10
+
+# Modo de atribuição: rodadas de escolha de somas sem conflito por fase
+MAX_RODADAS_ATRIBUICAO = 5
+
+
+class ObservadorConciliacao:
+    """
+    Recebe o andamento da conciliação. Esta versão não faz nada, para uso em
+    lote (CLI, agendamentos, workers); a interface Streamlit usa uma subclasse
+    que exibe mensagens, barra de progresso e o resumo final.
+    """
+
+    def inicio(self, total_ofx, total_rel):
+        """Início da conciliação, com a quantidade de transações de cada lado."""
+
+    def etapa(self, texto):
+        """Mudança de etapa (texto curto para exibição)."""
+
+    def progresso(self, percentual):
+        """Percentual concluído, de 0 a 100."""
+
+    def transacao(self, posicao, ofx_item, centavos):
+        """Transação do extrato prestes a ser analisada (posicao = ordem na fila)."""
+
+    def fim(self, estatisticas):
+        """Fim da conciliação, com as estatísticas de Conciliador.estatisticas."""
+
 
 class Conciliador:
-    def __init__(self, trans_ofx, trans_rel):
+    def __init__(self, trans_ofx, trans_rel, motor_soma=None, janela_dias=0, feriados=None,
+                 usar_descricoes=False, atribuicao_otima=False, janela_liquidacao=0,
+                 filtro_liquidacao=None, frequencias_descricoes=None):
         """
         trans_ofx: Lista de transações do extrato bancário (OFX).
         trans_rel: Lista de transações do relatório (ERP/Financeiro).
+        (Transacao ou dicionários com as mesmas chaves.)
+        motor_soma: Motor de busca de somas (padrão: MotorSomaSubconjuntos()).
+        janela_dias: tolerância de ±N dias úteis entre a data do extrato e a do relatório.
+            Os matches no mesmo dia são sempre feitos primeiro; a janela só é usada
+            em uma segunda passada, para o que sobrou.
+        feriados: datas (date) que não contam como dia útil na janela.
+        usar_descricoes: consulta as descrições (índice invertido de similaridade.py)
+            para desempatar itens do relatório com o mesmo valor e, ao final, sugerir
+            pares com valor próximo e descrição parecida ("Sugerido (Descrição)").
+        frequencias_descricoes: frequências dos tokens no relatório inteiro (ver
+            IndiceDescricoes); usadas quando o Conciliador recebe só parte do relatório.
+        atribuicao_otima: resolve cada dia por fases para todos os itens pendentes
+            (primeiro todos os exatos, depois as somas sem conflito) em vez de
+            decidir transação a transação na ordem do extrato (_processar_atribuicao).
+        janela_liquidacao: procura, para créditos do extrato ainda não conciliados,
+            grupos de recebíveis do relatório lançados até N dias úteis antes do crédito
+            cuja soma seja o valor creditado (liquidação de cartões e gateways:
+            "Conciliado (Liquidação)").
+        filtro_liquidacao: palavras (ex.: ["cielo", "rede"]) que restringem os
+            recebíveis da liquidação aos que as têm na descrição ou na conta.
+
+        Cada transação é identificada pela sua posição na lista de origem
+        (ofx_id / rel_id), de modo que lançamentos idênticos continuam distintos.
         """
+        # As listas de entrada não são alteradas, então não precisam ser copiadas
         self.trans_ofx = trans_ofx
-        self.trans_rel = trans_rel.copy()
+        self.trans_rel = trans_rel
+        self.motor_soma = motor_soma if motor_soma is not None else MotorSomaSubconjuntos()
         self.resultado = []
-        self.nao_conciliadas_rel = trans_rel.copy()
+        # Preenchido ao final de executar()
+        self.estatisticas = {}
+        # Dias conciliados nesta execução e dias reaproveitados do estado incremental
+        self.dias_processados = None
+        self.dias_reaproveitados = 0
+        # IDs das transações do extrato que já foram conciliadas
+        self.ofx_conciliados = set()
+        # Itens do relatório ainda não conciliados, indexados pela posição original.
+        # Um dict preserva a ordem de entrada e permite remoção em O(1).
+        self.nao_conciliadas_rel = dict(enumerate(trans_rel))
+        # Valores em centavos inteiros, por ID; toda a comparação e soma usa estes valores
+        self.centavos_ofx = [self._centavos(o) for o in self.trans_ofx]
+        self.centavos_rel = [self._centavos(r) for r in self.trans_rel]
+        # Índice (data, valor em centavos) -> posições no relatório, usado no match exato
+        self._indice_exato = {}
+        # Bolsões por (dia, sinal) com os centavos dos itens ainda pendentes de cada lado,
+        # atualizados a cada match para que as buscas por soma olhem só o dia.
+        self._bolsoes_rel = {}
+        self._bolsoes_ofx = {}
+        for idx, r in self.nao_conciliadas_rel.items():
+            if r["data"]:
+                centavos = self.centavos_rel[idx]
+                self._indice_exato.setdefault((r["data"].date(), centavos), deque()).append(idx)
+                self._bolsoes_rel.setdefault(self._chave_bolsao(r, centavos), {})[idx] = centavos
+        for idx, o in enumerate(self.trans_ofx):
+            if o["data"]:
+                centavos = self.centavos_ofx[idx]
+                self._bolsoes_ofx.setdefault(self._chave_bolsao(o, centavos), {})[idx] = centavos
+        
+        # Janela de datas: números de dia útil e índices ordenados para busca por bisect
+        self.janela_dias = janela_dias or 0
+        self.feriados = sorted(set(feriados or []))
+        self._dias_uteis = {}
+        self._indice_janela = {}
+        self._datas_rel = []
+        self._uteis_rel = []
+        self._datas_ofx = []
+        self._uteis_ofx = []
+        if self.janela_dias:
+            # Valor em centavos -> [(dia útil, dia do calendário, posição no relatório)] ordenada
+            for idx, r in self.nao_conciliadas_rel.items():
+                if r["data"]:
+                    dia = r["data"].date()
+                    self._indice_janela.setdefault(self.centavos_rel[idx], []).append(
+                        (self._dia_util(dia), dia.toordinal(), idx)
+                    )
+            for lista in self._indice_janela.values():
+                lista.sort()
+            # Datas com itens no relatório (e seus dias úteis), para achar os bolsões da janela
+            self._datas_rel = sorted({dia for dia, _ in self._bolsoes_rel})
+            self._uteis_rel = [self._dia_util(dia) for dia in self._datas_rel]
+            self._datas_ofx = sorted({dia for dia, _ in self._bolsoes_ofx})
+            self._uteis_ofx = [self._dia_util(dia) for dia in self._datas_ofx]
+        
+        # Índice invertido das descrições do relatório (só com usar_descricoes)
+        self.usar_descricoes = usar_descricoes
+        self._indice_descricoes = None
+        if usar_descricoes:
+            self._indice_descricoes = IndiceDescricoes(
+                ((idx, r["descricao"], r["data"].date()) for idx, r in self.nao_conciliadas_rel.items() if r["data"]),
+                frequencias_descricoes
+            )
+        self.atribuicao_otima = atribuicao_otima
+        
+        # Liquidações: recebíveis elegíveis ordenados por (dia útil, dia, posição)
+        self.janela_liquidacao = janela_liquidacao or 0
+        self.filtro_liquidacao = [normalizar(p) for p in (filtro_liquidacao or []) if p.strip()]
+        self._liquidacao = []
+        self._uteis_liquidacao = []
+        if self.janela_liquidacao:
+            self._liquidacao = sorted(
+                (self._dia_util(r["data"].date()), r["data"].date().toordinal(), idx)
+                for idx, r in self.nao_conciliadas_rel.items()
+                if r["data"] and self.centavos_rel[idx] > 0 and self._elegivel_liquidacao(r)
+            )
+            self._uteis_liquidacao = [item[0] for item in self._liquidacao]
+
+    def configuracao(self):
+        """Opções do Conciliador que influenciam o resultado (para cache e estado incremental)."""
+        return {
+            "janela_dias": self.janela_dias,
+            "feriados": [dia.isoformat() for dia in self.feriados],
+            "usar_descricoes": self.usar_descricoes,
+            "atribuicao_otima": self.atribuicao_otima,
+            "janela_liquidacao": self.janela_liquidacao,
+            "filtro_liquidacao": self.filtro_liquidacao,
+        }
+
+    def _dia_util(self, dia):
+        """
+        Número sequencial do dia útil (segunda a sexta, fora os feriados).
+        Sábado e domingo recebem o número da segunda-feira seguinte.
+        """
+        numero = self._dias_uteis.get(dia)
+        if numero is None:
+            numero = int(np.busday_count(_DATA_BASE_DIAS_UTEIS, dia, holidays=self.feriados))
+            self._dias_uteis[dia] = numero
+        return numero
+
+    def _candidatas_rel(self, data, sinal, janela=False):
+        """
+        Itens pendentes do relatório ({posição: centavos}) com o sinal informado,
+        no mesmo dia ou, com janela, em todos os dias até ±janela_dias dias úteis.
+        """
+        return self._bolsoes_janela(self._bolsoes_rel, self._datas_rel, self._uteis_rel, data, sinal, janela)
+
+    def _elegivel_liquidacao(self, item):
+        """Item do relatório que pode compor uma liquidação (conforme filtro_liquidacao)."""
+        if not self.filtro_liquidacao:
+            return True
+        texto = normalizar(f"{item['descricao']} {item.get('conta') or ''}")
+        return any(palavra in texto for palavra in self.filtro_liquidacao)
+
+    def _candidatas_ofx(self, data, sinal, janela=False):
+        """Itens pendentes do extrato ({posição: centavos}), como em _candidatas_rel."""
+        return self._bolsoes_janela(self._bolsoes_ofx, self._datas_ofx, self._uteis_ofx, data, sinal, janela)
+
+    def _bolsoes_janela(self, bolsoes, datas, uteis, data, sinal, janela):
+        if not janela:
+            return bolsoes.get((data, sinal), {})
+        util = self._dia_util(data)
+        inicio = bisect_left(uteis, util - self.janela_dias)
+        fim = bisect_right(uteis, util + self.janela_dias)
+        candidatas = {}
+        for dia in datas[inicio:fim]:
+            candidatas.update(bolsoes.get((dia, sinal), {}))
+        return candidatas
+
+    @staticmethod
+    def _centavos(item):
+        """
+        Retorna o valor da transação em centavos inteiros.
+        Usa o campo 'centavos' gerado pelos leitores e, na falta dele, converte 'valor'.
+        """
+        centavos = item.get("centavos")
+        return centavos if centavos is not None else para_centavos(item["valor"])
+
+    @staticmethod
+    def _sinal(valor):
+        """Retorna 1 para valores positivos, -1 para negativos e 0 para zero."""
+        return (valor > 0) - (valor < 0)
 
-    def executar(self):
+    def _chave_bolsao(self, item, centavos):
+        """Chave (dia, sinal) do bolsão ao qual a transação pertence."""
+        return (item["data"].date(), self._sinal(centavos))
+
+    def _remover_rel(self, idx):
+        """
+        Retira um item do relatório da lista de pendentes e do seu bolsão diário.
+        O índice exato é limpo de forma preguiçosa na próxima consulta.
+        """
+        r = self.nao_conciliadas_rel.pop(idx)
+        if r["data"]:
+            self._bolsoes_rel[self._chave_bolsao(r, self.centavos_rel[idx])].pop(idx, None)
+        return r
+
+    def _remover_ofx(self, idx):
+        """Marca um item do extrato como conciliado e o retira do seu bolsão diário."""
+        self.ofx_conciliados.add(idx)
+        o = self.trans_ofx[idx]
+        if o["data"]:
+            self._bolsoes_ofx[self._chave_bolsao(o, self.centavos_ofx[idx])].pop(idx, None)
+
+    def executar(self, observador=None, processos=None, estado=None):
         """
         Executa o fluxo principal de conciliação:
         1. Tenta casar transações (exato ou soma dupla).
@@ -24,172 +366,570 @@ class Conciliador:
            - Extrato Data, Extrato Valor, Extrato Descrição
            - Relatório Data, Relatório Valor, Relatório Descrição
            - Status
+        observador: recebe o andamento (ObservadorConciliacao); sem ele, nada é exibido.
+        processos: com 2 ou mais, os dias são conciliados em paralelo em um pool de processos.
+        estado: EstadoIncremental (incremental.py); só os dias novos ou alterados são
+        conciliados e o estado é atualizado com eles.
+        As estatísticas finais ficam em self.estatisticas.
         """
-        # Mensagens de feedback para o usuário
-        st.write("🔍 IA iniciando análise de transações...")
-        st.write(f"📊 Processando {len(self.trans_ofx)} transações do extrato bancário")
-        st.write(f"📋 Comparando com {len(self.trans_rel)} lançamentos do relatório")
-        
-        progress_bar = st.progress(0)
-        status_text = st.empty()
+        observador = observador if observador is not None else ObservadorConciliacao()
+        observador.inicio(len(self.trans_ofx), len(self.trans_rel))
         
-        # Processar conciliações com feedback
-        status_text.write("🧠 Analisando padrões de transações...")
-        self._processar_conciliacoes_com_feedback(progress_bar, status_text)
+        # Processar conciliações
+        observador.etapa("🧠 Analisando padrões de transações...")
+        if estado is not None or (processos and processos > 1):
+            self._processar_partes(observador, processos, estado)
+        else:
+            self._processar_conciliacoes(observador)
         
         # Processar não conciliados
-        status_text.write("⚖️ Identificando transações não conciliadas...")
+        observador.etapa("⚖️ Identificando transações não conciliadas...")
         self._processar_nao_conciliados()
         
         # Gerar resultado final
-        status_text.write("✅ Finalizando conciliação e gerando relatório...")
-        progress_bar.progress(100)
+        observador.etapa("✅ Finalizando conciliação e gerando relatório...")
+        observador.progresso(100)
         
         df = self._gerar_dataframe()
         
         # Estatísticas finais
-        conciliados = df[df['Status'].str.startswith('Conciliado')].shape[0]
-        nao_conciliados = df[df['Status'] == 'Não conciliado'].shape[0]
-        total = df.shape[0]
+        self.estatisticas = self._calcular_estatisticas(df)
+        observador.fim(self.estatisticas)
         
-        taxa_conciliacao = (conciliados / total) * 100 if total > 0 else 0
+        return df
+
+    def _calcular_estatisticas(self, df):
+        """
+        Estatísticas da conciliação: contagens por status, taxa de sucesso
+        e o resumo por dias (resumo_dias).
+        """
+        if df.empty:
+            conciliados = nao_conciliados = sugeridos = 0
+        else:
+            conciliados = int(df['Status'].str.startswith('Conciliado').sum())
+            nao_conciliados = int((df['Status'] == 'Não conciliado').sum())
+            sugeridos = int((df['Status'] == 'Sugerido (Descrição)').sum())
+        total = len(df)
+        
+        estatisticas = {
+            "total": total,
+            "conciliados": conciliados,
+            "nao_conciliados": nao_conciliados,
+            "sugeridos": sugeridos,
+            "taxa_conciliacao": (conciliados / total) * 100 if total > 0 else 0,
+            "buscas_interrompidas": getattr(self.motor_soma, "buscas_interrompidas", 0),
+            "dias_processados": self.dias_processados,
+            "dias_reaproveitados": self.dias_reaproveitados,
+        }
+        estatisticas.update(self.resumo_dias())
+        return estatisticas
+
+    def _processar_conciliacoes(self, observador):
+        """
+        Percorre o extrato buscando o melhor match de cada transação,
+        informando o andamento ao observador (0% a 70%).
+        """
+        self._processar_mesmo_dia(observador)
+        self._processar_entre_dias(observador)
+
+    def _pendentes_ofx(self):
+        """Transações do extrato ainda não conciliadas, na ordem de entrada: [(ofx_idx, ofx_item)]."""
+        return [
+            (ofx_idx, ofx_item) for ofx_idx, ofx_item in enumerate(self.trans_ofx)
+            if ofx_idx not in self.ofx_conciliados
+        ]
+
+    def _processar_mesmo_dia(self, observador):
+        """
+        Primeira etapa: matches entre itens da mesma data (exatos e por soma).
+        Cada dia é independente dos demais nesta etapa.
+        """
+        if self.atribuicao_otima:
+            self._processar_atribuicao(self._pendentes_ofx(), observador)
+        else:
+            self._processar_sequencial(self._pendentes_ofx(), observador)
+
+    def _processar_entre_dias(self, observador):
+        """
+        Etapas seguintes, sobre o que sobrou da primeira: janela de datas,
+        liquidações de recebíveis e sugestões pela descrição.
+        """
+        nao_conciliadas_ofx = self._pendentes_ofx()
+        if self.janela_dias:
+            observador.etapa(f"📅 Buscando correspondências em até {self.janela_dias} dia(s) útil(eis) de diferença...")
+            if self.atribuicao_otima:
+                self._processar_atribuicao(nao_conciliadas_ofx, observador, janela=True)
+            else:
+                self._processar_sequencial(nao_conciliadas_ofx, observador, janela=True)
         
-        st.write(f"✨ Conciliação finalizada! Taxa de sucesso: {taxa_conciliacao:.1f}%")
-        st.write(f"✓ {conciliados} transações conciliadas | ✗ {nao_conciliados} não conciliadas")
+        # Créditos que liquidam vários recebíveis de dias anteriores
+        if self.janela_liquidacao:
+            observador.etapa("💳 Procurando liquidações de recebíveis em dias anteriores...")
+            for ofx_idx, ofx_item in nao_conciliadas_ofx:
+                if ofx_idx in self.ofx_conciliados:
+                    continue
+                ids_rel = self._achar_liquidacao(ofx_idx, ofx_item)
+                if ids_rel:
+                    self._registrar_soma([ofx_idx], ids_rel, "Conciliado (Liquidação)")
         
-        # Adicionar resumo dos dias conciliados
-        self._mostrar_resumo_dias()
+        # Por último, pares de baixa confiança pela descrição
+        if self._indice_descricoes is not None:
+            observador.etapa("🔤 Comparando descrições das transações restantes...")
+            for ofx_idx, ofx_item in nao_conciliadas_ofx:
+                if ofx_idx in self.ofx_conciliados or not ofx_item["data"]:
+                    continue
+                rel_idx = self._achar_sugestao(ofx_idx, ofx_item)
+                if rel_idx is not None:
+                    self._registrar_match(ofx_idx, ofx_item, (rel_idx, "Sugerido (Descrição)"))
         
-        return df
-    def _processar_conciliacoes_com_feedback(self, progress_bar, status_text):
+        # Atualizar para 70% ao finalizar
+        observador.progresso(70)
+
+    def _processar_sequencial(self, nao_conciliadas_ofx, observador, janela=False):
         """
-        Versão do _processar_conciliacoes com feedback visual para o usuário
+        Modo padrão: cada transação do extrato, na ordem de entrada, fica com o
+        primeiro match encontrado (exato, soma do relatório ou soma do extrato).
+        Com janela=True, o que sobrou é procurado nos dias úteis vizinhos.
         """
-        nao_conciliadas_ofx = [ofx_item for ofx_item in self.trans_ofx if not any(r["ofx"] == ofx_item for r in self.resultado)]
+        if janela:
+            for ofx_idx, ofx_item in nao_conciliadas_ofx:
+                if ofx_idx in self.ofx_conciliados or not ofx_item["data"]:
+                    continue
+                match = self._encontrar_melhor_match(ofx_idx, ofx_item, janela=True)
+                if match:
+                    self._registrar_match(ofx_idx, ofx_item, match)
+            return
+        
         total = len(nao_conciliadas_ofx)
+        ultimo_progresso = -1
         
-        for i, ofx_item in enumerate(nao_conciliadas_ofx):
-            # Atualizar progresso
-            progress = int((i / total) * 70)  # Usa 70% da barra para esta etapa
-            progress_bar.progress(progress)
-            
-            # Mensagens dinâmicas para dar sensação de IA trabalhando
-            if i % 5 == 0:  # A cada 5 transações, muda a mensagem
-                mensagens = [
-                    "🔄 Comparando padrões de transações...",
-                    "🧮 Calculando correspondências exatas...",
-                    "🔍 Buscando combinações de valores...",
-                    "📅 Analisando datas e valores...",
-                    "🧩 Verificando possíveis agrupamentos...",
-                    "⚙️ Processando algoritmos de conciliação...",
-                    "📊 Aplicando análise estatística...",
-                    "🤖 IA trabalhando na conciliação..."
-                ]
-                import random
-                status_text.write(random.choice(mensagens))
+        for i, (ofx_idx, ofx_item) in enumerate(nao_conciliadas_ofx):
+            # Itens consumidos por uma soma inversa anterior já estão conciliados
+            if ofx_idx in self.ofx_conciliados:
+                continue
             
-            # Mostrar detalhes da transação atual (versão simplificada)
-            if i % 10 == 0:  # A cada 10 transações
-                data_str = ofx_item["data"].strftime('%d/%m/%Y') if ofx_item["data"] else "N/A"
-                valor_str = f"R$ {abs(ofx_item['valor']):.2f}".replace('.', ',')
-                status_text.write(f"💱 Analisando transação de {data_str}: {valor_str}")
+            # Atualizar progresso (usa 70% da barra para esta etapa)
+            progresso = int((i / total) * 70)
+            if progresso != ultimo_progresso:
+                observador.progresso(progresso)
+                ultimo_progresso = progresso
+            observador.transacao(i, ofx_item, self.centavos_ofx[ofx_idx])
             
             # Processar a conciliação
-            match = self._encontrar_melhor_match(ofx_item)
+            match = self._encontrar_melhor_match(ofx_idx, ofx_item)
             if match:
-                self._registrar_match(ofx_item, match)
+                self._registrar_match(ofx_idx, ofx_item, match)
+
+    def _processar_atribuicao(self, nao_conciliadas_ofx, observador, janela=False):
+        """
+        Modo de atribuição (atribuicao_otima): cada fase é resolvida para todos os
+        itens pendentes antes da seguinte, em vez de transação a transação:
+        1. matches exatos de valor: cada (dia, valor) casa o máximo de pares possível,
+           sem que uma soma anterior consuma um item que tinha par exato;
+        2. somas (1 extrato -> N relatório e N extrato -> 1 relatório) entre o que
+           sobrou, escolhidas sem conflito por _empacotar_somas.
+        Com janela=True, as duas fases rodam na janela de datas para o que sobrou.
+        """
+        pendentes = [
+            (ofx_idx, ofx_item) for ofx_idx, ofx_item in nao_conciliadas_ofx
+            if ofx_idx not in self.ofx_conciliados and ofx_item["data"]
+        ]
+        for i, (ofx_idx, ofx_item) in enumerate(pendentes):
+            observador.transacao(i, ofx_item, self.centavos_ofx[ofx_idx])
+            data = ofx_item["data"].date()
+            centavos = self.centavos_ofx[ofx_idx]
+            if janela:
+                exato = self._achar_match_exato_janela(data, centavos, ofx_item["descricao"])
+            else:
+                exato = self._achar_match_exato(data, centavos, ofx_item["descricao"])
+            if exato is not None:
+                self._registrar_match(ofx_idx, ofx_item, (exato, "Conciliado"))
+        if not janela:
+            observador.progresso(35)
         
-        # Atualizar para 70% ao finalizar
-        progress_bar.progress(70)
-    def _encontrar_melhor_match(self, ofx_item):
+        self._empacotar_somas(janela)
+        if not janela:
+            observador.progresso(70)
+
+    def _empacotar_somas(self, janela=False):
+        """
+        Escolhe um conjunto de matches por soma sem conflito entre os itens pendentes.
+        Cada item pendente (do extrato e do relatório) gera, sem consumir nada, um
+        grupo candidato pelo motor de somas; os grupos são aceitos do menor para o
+        maior desde que não usem item já escolhido. Itens cujo grupo conflitou são
+        consultados de novo na rodada seguinte, com o que restou (no máximo
+        MAX_RODADAS_ATRIBUICAO rodadas).
+        """
+        consultar = [("extrato", idx) for idx, c in enumerate(self.centavos_ofx)
+                     if idx not in self.ofx_conciliados and self.trans_ofx[idx]["data"] and c]
+        consultar += [("relatorio", idx) for idx, r in self.nao_conciliadas_rel.items()
+                      if r["data"] and self.centavos_rel[idx]]
+        
+        for _ in range(MAX_RODADAS_ATRIBUICAO):
+            candidatos = []
+            for ancora in consultar:
+                grupo = self._candidato_soma(ancora, janela)
+                if grupo is not None:
+                    candidatos.append((len(grupo[0]) + len(grupo[1]), grupo, ancora))
+            candidatos.sort()
+            
+            conflitos = []
+            for _, (ids_ofx, ids_rel), ancora in candidatos:
+                livres = (all(i not in self.ofx_conciliados for i in ids_ofx)
+                          and all(i in self.nao_conciliadas_rel for i in ids_rel))
+                if livres:
+                    self._registrar_soma(ids_ofx, ids_rel)
+                else:
+                    conflitos.append(ancora)
+            
+            # Só vale consultar de novo quem ainda está pendente
+            consultar = [
+                (origem, idx) for origem, idx in conflitos
+                if (idx not in self.ofx_conciliados if origem == "extrato" else idx in self.nao_conciliadas_rel)
+            ]
+            if not consultar:
+                break
+
+    def _candidato_soma(self, ancora, janela=False):
+        """
+        Grupo candidato (ids do extrato, ids do relatório) para um item pendente,
+        sem consumir nada: ("extrato", idx) procura itens do relatório que somem o
+        seu valor e ("relatorio", idx) procura itens do extrato. Retorna None se não houver.
+        """
+        origem, idx = ancora
+        if origem == "extrato":
+            centavos = self.centavos_ofx[idx]
+            candidatas = self._candidatas_rel(self.trans_ofx[idx]["data"].date(), self._sinal(centavos), janela)
+        else:
+            centavos = self.centavos_rel[idx]
+            candidatas = self._candidatas_ofx(self.trans_rel[idx]["data"].date(), self._sinal(centavos), janela)
+        if len(candidatas) < 2:
+            return None
+        ids = self._buscar_soma(candidatas, centavos)
+        if not ids:
+            return None
+        return ((idx,), tuple(ids)) if origem == "extrato" else (tuple(ids), (idx,))
+
+    def _buscar_soma(self, candidatas, alvo):
+        """
+        Grupo de itens ({id: centavos}, com o sinal do alvo) cuja soma é o alvo.
+        Pares, o caso mais comum, são procurados primeiro em O(n) com uma tabela
+        hash dos valores já vistos; o motor de somas só é chamado para grupos
+        de 3 ou mais itens. Retorna a lista de IDs (na ordem de entrada) ou None.
+        """
+        vistos = {}
+        for idx, centavos in candidatas.items():
+            par = vistos.get(alvo - centavos)
+            if par is not None:
+                return [par, idx]
+            vistos.setdefault(centavos, idx)
+        return self.motor_soma.buscar(list(candidatas.items()), alvo, min_itens=3)
+
+    def _registrar_soma(self, ids_ofx, ids_rel, status="Conciliado (Soma)"):
+        """Registra um match por soma: um item do extrato com N do relatório ou N do extrato com um do relatório."""
+        for rel_idx in ids_rel:
+            self._remover_rel(rel_idx)
+        for ofx_idx in ids_ofx:
+            self._remover_ofx(ofx_idx)
+            for rel_idx in ids_rel:
+                self.resultado.append({
+                    "ofx": self.trans_ofx[ofx_idx],
+                    "rel": self.trans_rel[rel_idx],
+                    "ofx_id": ofx_idx,
+                    "rel_id": rel_idx,
+                    "status": status
+                })
+
+    def _partes_por_dia(self):
+        """
+        Divide as transações em subproblemas independentes, um por dia: a etapa
+        _processar_mesmo_dia só combina itens da mesma data. Itens sem data nunca
+        são conciliados e ficam fora das partes.
+        Retorna [(dia, ids_ofx, ids_rel)] em ordem de data, com os IDs na ordem original.
+        """
+        partes = {}
+        for idx, o in enumerate(self.trans_ofx):
+            if o["data"]:
+                partes.setdefault(o["data"].date(), ([], []))[0].append(idx)
+        for idx, r in enumerate(self.trans_rel):
+            if r["data"]:
+                partes.setdefault(r["data"].date(), ([], []))[1].append(idx)
+        # Dias sem itens do extrato não têm o que conciliar
+        return [(dia, ids_ofx, ids_rel) for dia, (ids_ofx, ids_rel) in sorted(partes.items()) if ids_ofx]
+
+    def _impressao_parte(self, ids_ofx, ids_rel):
+        """
+        Impressão digital (hash) das transações de um dia, na ordem de entrada:
+        data, valor em centavos, descrição e FITID/conta de cada lado. Um dia com a
+        mesma impressão tem exatamente o mesmo resultado de conciliação.
+        """
+        h = hashlib.sha1()
+        for idx in ids_ofx:
+            o = self.trans_ofx[idx]
+            h.update(repr((o["data"].isoformat(), self.centavos_ofx[idx], o["descricao"], o.get("fitid"))).encode())
+        h.update(b"|")
+        for idx in ids_rel:
+            r = self.trans_rel[idx]
+            h.update(repr((r["data"].isoformat(), self.centavos_rel[idx], r["descricao"], r.get("conta"))).encode())
+        return h.hexdigest()
+
+    def _processar_partes(self, observador, processos=None, estado=None):
+        """
+        Concilia dia a dia (_partes_por_dia) a etapa dos matches do mesmo dia:
+        - com um estado incremental, dias com a mesma impressão digital de uma
+          execução anterior reaproveitam os matches salvos e não são processados;
+        - com processos > 1, os dias restantes rodam em paralelo (ProcessPoolExecutor).
+        As etapas que cruzam dias (janela de datas, liquidações e sugestões) rodam
+        depois, neste processo, sobre o que sobrou de todos os dias; elas nunca são
+        salvas no estado e o resultado é o mesmo da conciliação sem partes.
+        As frequências das descrições (usar_descricoes) ficam fora da impressão: elas
+        mudam com qualquer dia novo do relatório e invalidariam todos os dias salvos.
+        Um dia reaproveitado mantém os desempates da execução em que foi conciliado.
+        Os matches são incorporados ao resultado em ordem de data, de modo que o
+        resultado é o mesmo a cada execução.
+        """
+        partes = self._partes_por_dia()
+        matches_por_parte = [None] * len(partes)
+        impressoes = [None] * len(partes)
+        if estado is not None:
+            # Um estado gravado com outras opções (ex.: outra janela de datas) não vale
+            estado.usar_opcoes(self.configuracao())
+            for n, (dia, ids_ofx, ids_rel) in enumerate(partes):
+                impressoes[n] = self._impressao_parte(ids_ofx, ids_rel)
+                matches_por_parte[n] = estado.obter(dia, impressoes[n])
+        pendentes = [n for n in range(len(partes)) if matches_por_parte[n] is None]
+        self.dias_reaproveitados = len(partes) - len(pendentes)
+        self.dias_processados = len(pendentes)
+        
+        # Cada parte pontua as descrições com as frequências do relatório inteiro
+        configuracao = self.configuracao()
+        if self._indice_descricoes is not None:
+            configuracao["frequencias_descricoes"] = self._indice_descricoes.frequencias
+        tarefas = [
+            ([self.trans_ofx[i] for i in partes[n][1]], [self.trans_rel[i] for i in partes[n][2]],
+             copy.copy(self.motor_soma), configuracao)
+            for n in pendentes
+        ]
+        if processos and processos > 1 and len(tarefas) > 1:
+            # Lotes de alguns dias por envio reduzem o custo de comunicação entre processos
+            lote = max(1, len(tarefas) // (processos * 4))
+            executor = ProcessPoolExecutor(max_workers=processos)
+            resultados = executor.map(_conciliar_parte, tarefas, chunksize=lote)
+        else:
+            executor = None
+            resultados = map(_conciliar_parte, tarefas)
+        
+        try:
+            for feitos, (n, (matches, interrompidas)) in enumerate(zip(pendentes, resultados), 1):
+                matches_por_parte[n] = matches
+                if estado is not None:
+                    estado.registrar(partes[n][0], impressoes[n], matches)
+                if hasattr(self.motor_soma, "buscas_interrompidas"):
+                    self.motor_soma.buscas_interrompidas += interrompidas
+                observador.progresso(int((feitos / len(pendentes)) * 70))
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        
+        for (_, ids_ofx, ids_rel), matches in zip(partes, matches_por_parte):
+            # IDs locais da parte -> IDs originais
+            for ofx_local, rel_local, status in matches:
+                ofx_idx, rel_idx = ids_ofx[ofx_local], ids_rel[rel_local]
+                if ofx_idx not in self.ofx_conciliados:
+                    self._remover_ofx(ofx_idx)
+                if rel_idx in self.nao_conciliadas_rel:
+                    self._remover_rel(rel_idx)
+                self.resultado.append({
+                    "ofx": self.trans_ofx[ofx_idx],
+                    "rel": self.trans_rel[rel_idx],
+                    "ofx_id": ofx_idx,
+                    "rel_id": rel_idx,
+                    "status": status
+                })
+        
+        self._processar_entre_dias(observador)
+
+    def _encontrar_melhor_match(self, ofx_idx, ofx_item, janela=False):
         """
         Tenta encontrar uma correspondência exata ou por soma dupla
         para a transação do extrato.
+        janela: procura no relatório em ±janela_dias dias úteis em vez do mesmo dia.
         """
         data = ofx_item["data"].date() if ofx_item["data"] else None
-        valor = ofx_item["valor"]
+        centavos = self.centavos_ofx[ofx_idx]
         
-        exato = self._achar_match_exato(data, valor)
-        if exato:
+        if janela:
+            exato = self._achar_match_exato_janela(data, centavos, ofx_item["descricao"])
+        else:
+            exato = self._achar_match_exato(data, centavos, ofx_item["descricao"])
+        if exato is not None:
             return (exato, "Conciliado")
         
-        duplo = self._achar_match_duplo(data, valor)
+        duplo = self._achar_match_duplo(data, centavos, janela)
         if duplo:
             return (duplo, "Conciliado (Soma)")
         
         # Verificar se este item do extrato pode fazer parte de uma soma
         # que corresponde a um único item do relatório
-        inverso = self._achar_match_inverso(ofx_item)
-        if inverso:
+        inverso = self._achar_match_inverso(ofx_idx, ofx_item, janela)
+        if inverso is not None:
             return (inverso, "Conciliado (Soma)")
         
         return None
 
-    def _achar_match_exato(self, data, valor, tol=1e-4):
+    def _achar_match_exato(self, data, centavos, descricao=None):
         """
         Tenta achar uma única transação do relatório que case
-        com a data e o valor do extrato dentro de uma tolerância.
+        com a data e o valor (em centavos) do extrato.
+        A busca usa o índice (data, centavos), em O(1) por transação.
+        Com usar_descricoes, se houver mais de um item com o mesmo valor no dia,
+        fica o de descrição mais parecida com a do extrato (empate: o primeiro).
+        Retorna o ID do item do relatório ou None.
         """
-        for r in self.nao_conciliadas_rel:
-            if r["data"] and r["data"].date() == data:
-                if abs(r["valor"] - valor) < tol:
-                    self.nao_conciliadas_rel.remove(r)
-                    return r
-        return None
+        fila = self._indice_exato.get((data, centavos))
+        # Itens já conciliados por outra estratégia são descartados aqui
+        while fila and fila[0] not in self.nao_conciliadas_rel:
+            fila.popleft()
+        if not fila:
+            return None
+        
+        if self._indice_descricoes is None or len(fila) == 1:
+            idx = fila.popleft()
+        else:
+            pendentes = [i for i in fila if i in self.nao_conciliadas_rel]
+            idx = max(pendentes, key=lambda i: (self._indice_descricoes.similaridade(descricao, i), -i))
+            fila.remove(idx)
+        self._remover_rel(idx)
+        return idx
 
-    def _achar_match_duplo(self, data, valor, tol=1e-4):
+    def _achar_match_exato_janela(self, data, centavos, descricao=None):
         """
-        Tenta achar uma combinação de transações do relatório cuja soma dos valores
-        case com a data e o valor do extrato dentro de uma tolerância.
-        Limita o número de combinações verificadas para evitar processamento infinito.
-        Apenas valores com o mesmo sinal (positivo ou negativo) são considerados.
+        Match exato de valor com a data do relatório a até ±janela_dias dias úteis.
+        O índice por valor é ordenado por dia útil, então a busca é um bisect
+        sobre o intervalo da janela. Prefere o item mais próximo em dias úteis,
+        depois (com usar_descricoes) o de descrição mais parecida, o mais próximo
+        em dias corridos e, por fim, o primeiro do relatório.
+        Retorna o ID do item do relatório ou None.
         """
-        candidatas = [r for r in self.nao_conciliadas_rel if r["data"] and r["data"].date() == data]
-        
-        # Otimização 1: Limitar o número de candidatas para evitar explosão combinatória
-        max_candidatas = 15  # Limitar número máximo de candidatas por data
-        if len(candidatas) > max_candidatas:
-            # Ordenar candidatas por proximidade com o valor alvo
-            candidatas.sort(key=lambda x: abs(x["valor"] - valor))
-            candidatas = candidatas[:max_candidatas]
+        lista = self._indice_janela.get(centavos)
+        if not data or not lista:
+            return None
+        util = self._dia_util(data)
+        inicio = bisect_left(lista, (util - self.janela_dias,))
+        fim = bisect_right(lista, (util + self.janela_dias, float("inf")))
         
-        max_combinations = 1000  # Limite de combinações a serem verificadas
-        checked_combinations = 0
+        # Descartar do intervalo os itens já conciliados (limpeza preguiçosa)
+        pendentes = [item for item in lista[inicio:fim] if item[2] in self.nao_conciliadas_rel]
+        lista[inicio:fim] = pendentes
+        if not pendentes:
+            return None
         
-        # Filtrar candidatas pelo sinal do valor do extrato
-        if valor > 0:
-            candidatas = [r for r in candidatas if r["valor"] > 0]
+        ordinal = data.toordinal()
+        indice = self._indice_descricoes if len(pendentes) > 1 else None
+        escolhido = min(pendentes, key=lambda item: (
+            abs(item[0] - util),
+            -indice.similaridade(descricao, item[2]) if indice is not None else 0,
+            abs(item[1] - ordinal),
+            item[2],
+        ))
+        lista.remove(escolhido)
+        self._remover_rel(escolhido[2])
+        return escolhido[2]
+
+    def _achar_sugestao(self, ofx_idx, ofx_item):
+        """
+        Sugestão de baixa confiança para um item do extrato que não casou por valor:
+        o item pendente do relatório de descrição mais parecida (similaridade mínima
+        LIMIAR_SUGESTAO), com o mesmo sinal, no mesmo dia (ou na janela de dias úteis)
+        e valor a até TOLERANCIA_SUGESTAO do valor do extrato.
+        Só são avaliados os itens dos dias possíveis que compartilham tokens com a
+        descrição do extrato (o índice é separado por dia).
+        Retorna o ID do item do relatório ou None.
+        """
+        data = ofx_item["data"].date()
+        centavos = self.centavos_ofx[ofx_idx]
+        sinal = self._sinal(centavos)
+        if not sinal:
+            return None
+        tolerancia = abs(centavos) * TOLERANCIA_SUGESTAO
+        if self.janela_dias:
+            util = self._dia_util(data)
+            inicio = bisect_left(self._uteis_rel, util - self.janela_dias)
+            fim = bisect_right(self._uteis_rel, util + self.janela_dias)
+            dias = self._datas_rel[inicio:fim]
         else:
-            candidatas = [r for r in candidatas if r["valor"] < 0]
-        
-        # Otimização 2: Começar com pares (mais comuns) e limitar o tamanho máximo da combinação
-        max_combo_size = min(4, len(candidatas))  # Limitar a no máximo 4 itens por combinação
+            dias = [data]
         
-        for n in range(2, max_combo_size + 1):
-            # Otimização 3: Estimar número de combinações e pular se for muito grande
-            from math import comb
-            estimated_combinations = comb(len(candidatas), n)
-            if estimated_combinations > 10000:  # Se estimativa for muito alta, pular
+        for _, idx in self._indice_descricoes.candidatos(ofx_item["descricao"], LIMIAR_SUGESTAO, dias):
+            if idx not in self.nao_conciliadas_rel:
                 continue
-                
-            for combo in combinations(candidatas, n):
-                if checked_combinations >= max_combinations:
-                    return None  # Retorna None se o limite de combinações for atingido
-                
-                # Verificar se todos os valores têm o mesmo sinal
-                sinais = [1 if item["valor"] > 0 else -1 for item in combo]
-                if len(set(sinais)) > 1:
-                    continue  # Pular se houver valores com sinais diferentes
-                
-                soma = sum(item["valor"] for item in combo)
-                if abs(soma - valor) < tol:
-                    for m in combo:
-                        self.nao_conciliadas_rel.remove(m)
-                    return list(combo)
-                checked_combinations += 1
+            rel_centavos = self.centavos_rel[idx]
+            if self._sinal(rel_centavos) != sinal or abs(rel_centavos - centavos) > tolerancia:
+                continue
+            self._remover_rel(idx)
+            return idx
         return None
+
+    def _achar_liquidacao(self, ofx_idx, ofx_item):
+        """
+        Liquidação: 2 ou mais recebíveis pendentes do relatório, consecutivos na ordem
+        de data, lançados de janela_liquidacao dias úteis antes até o dia do crédito,
+        cuja soma é o valor do crédito. Os recebíveis da janela saem do índice ordenado
+        por bisect; com valores positivos, as somas dos sufixos são todas distintas,
+        então uma tabela soma -> posição acha o grupo em O(n), preferindo o que começa
+        mais perto da data do crédito.
+        Se nenhum trecho consecutivo fecha (ex.: recebíveis de outro adquirente
+        intercalados, sem filtro_liquidacao), o motor de somas procura um grupo
+        qualquer entre os recebíveis da janela, com os seus limites de tamanho e tempo.
+        Retorna a lista de IDs do relatório ou None.
+        """
+        centavos = self.centavos_ofx[ofx_idx]
+        if centavos <= 0 or not ofx_item["data"]:
+            return None
+        util = self._dia_util(ofx_item["data"].date())
+        inicio = bisect_left(self._uteis_liquidacao, util - self.janela_liquidacao)
+        fim = bisect_right(self._uteis_liquidacao, util)
+        itens = [idx for _, _, idx in self._liquidacao[inicio:fim] if idx in self.nao_conciliadas_rel]
+        
+        # posicoes[soma de itens[j:]] = j; o grupo itens[i:j] soma sufixo(i) - sufixo(j)
+        posicoes = {0: len(itens)}
+        soma = 0
+        for i in range(len(itens) - 1, -1, -1):
+            soma += self.centavos_rel[itens[i]]
+            j = posicoes.get(soma - centavos)
+            if j is not None and j - i >= 2:
+                return itens[i:j]
+            posicoes[soma] = i
+        
+        if len(itens) < 2:
+            return None
+        return self.motor_soma.buscar([(idx, self.centavos_rel[idx]) for idx in itens], centavos, min_itens=2)
+
+    def _achar_match_duplo(self, data, centavos, janela=False):
+        """
+        Tenta achar uma combinação de transações do relatório cuja soma dos valores
+        (em centavos) seja igual à data e ao valor do extrato.
+        Pares são achados por tabela hash (_buscar_soma); grupos maiores são
+        delegados ao motor de somas, limitado em tamanho de grupo e tempo.
+        Apenas valores com o mesmo sinal (positivo ou negativo) são considerados.
+        """
+        sinal = self._sinal(centavos)
+        if not data or not sinal:
+            return None
+        
+        # Apenas o bolsão do dia (ou dos dias da janela) com o mesmo sinal do extrato
+        candidatas = self._candidatas_rel(data, sinal, janela)
+        if len(candidatas) < 2:
+            return None
+        
+        ids = self._buscar_soma(candidatas, centavos)
+        if not ids:
+            return None
+        for idx in ids:
+            self._remover_rel(idx)
+        return ids
         
-    def _achar_match_inverso(self, ofx_item, tol=1e-4):
+    def _achar_match_inverso(self, ofx_idx, ofx_item, janela=False):
         """
         Verifica se este item do extrato, combinado com outros itens do extrato,
         pode corresponder a um único item do relatório.
@@ -197,76 +937,128 @@ class Conciliador:
         Apenas valores com o mesmo sinal (positivo ou negativo) são considerados.
         """
         data = ofx_item["data"].date() if ofx_item["data"] else None
-        if not data:
+        centavos = self.centavos_ofx[ofx_idx]
+        sinal = self._sinal(centavos)
+        if not data or not sinal:
             return None
             
-        # Encontrar outros itens do extrato com a mesma data que ainda não foram conciliados
+        # Outros itens pendentes do extrato no mesmo dia e com o mesmo sinal
         itens_mesma_data = [
-            item for item in self.trans_ofx 
-            if item["data"] and item["data"].date() == data
-            and not any(r["ofx"] == item for r in self.resultado)
-            and item != ofx_item  # Excluir o próprio item
-            and ((item["valor"] > 0 and ofx_item["valor"] > 0) or  # Garantir mesmo sinal
-                 (item["valor"] < 0 and ofx_item["valor"] < 0))
+            (idx, c) for idx, c in self._bolsoes_ofx.get((data, sinal), {}).items()
+            if idx != ofx_idx  # Excluir o próprio item
         ]
         
         # Adicionar o item atual à lista
-        todos_itens = [ofx_item] + itens_mesma_data
+        todos_itens = [(ofx_idx, centavos)] + itens_mesma_data
+        candidatas_rel = self._candidatas_rel(data, sinal, janela)
         
-        # Verificar combinações de 2 a N itens (limitado a combinações razoáveis)
-        max_combinacoes = min(5, len(todos_itens))  # Limitar para evitar explosão combinatória
+        # Pares (este item + outro do extrato) em O(n): tabela valor -> primeiro item
+        # do relatório com esse valor, consultada para cada outro item do dia
+        primeiro_rel = {}
+        for rel_idx, rel_centavos in candidatas_rel.items():
+            primeiro_rel.setdefault(rel_centavos, rel_idx)
+        for outro_idx, outro_centavos in itens_mesma_data:
+            rel_idx = primeiro_rel.get(centavos + outro_centavos)
+            if rel_idx is not None:
+                # O item atual será marcado pelo chamador
+                self._registrar_soma([outro_idx], [rel_idx])
+                return rel_idx
         
-        for n in range(2, max_combinacoes + 1):
-            for combo in combinations(todos_itens, n):
-                # Se o item atual não estiver na combinação, pular
-                if ofx_item not in combo:
-                    continue
-                
-                # Verificar se todos os valores têm o mesmo sinal
-                sinais = [1 if item["valor"] > 0 else -1 for item in combo]
-                if len(set(sinais)) > 1:
-                    continue  # Pular se houver valores com sinais diferentes
-                    
-                soma_extrato = sum(item["valor"] for item in combo)
-                
-                # Procurar um item no relatório com valor correspondente à soma e mesmo sinal
-                for rel_item in self.nao_conciliadas_rel:
-                    if rel_item["data"] and rel_item["data"].date() == data:
-                        # Verificar se o sinal do relatório é o mesmo da soma do extrato
-                        if (soma_extrato > 0 and rel_item["valor"] > 0) or (soma_extrato < 0 and rel_item["valor"] < 0):
-                            if abs(rel_item["valor"] - soma_extrato) < tol:
-                                # Encontrou! Marcar todos os itens do extrato como conciliados
-                                # exceto o atual (que será marcado pelo chamador)
-                                outros_itens = [item for item in combo if item != ofx_item]
-                                
-                                # Registrar os outros itens como conciliados
-                                for outro in outros_itens:
-                                    self.resultado.append({
-                                        "ofx": outro,
-                                        "rel": rel_item,  # Mesmo item do relatório
-                                        "status": "Conciliado (Soma)"
-                                    })
-                                
-                                # Remover o item do relatório da lista de não conciliados
-                                self.nao_conciliadas_rel.remove(rel_item)
-                                
-                                # Retornar o item do relatório para o item atual
-                                return rel_item
+        # Grupos de 3 a N itens (limitado a grupos razoáveis), sempre com o item atual:
+        # busca em profundidade com poda, conferindo cada soma na tabela de valores do relatório
+        if not primeiro_rel:
+            return None
+        valores = [abs(c) for _, c in itens_mesma_data]
+        alvos = sorted({abs(c) for c in primeiro_rel})
+        max_itens = min(5, len(todos_itens))  # Limitar para evitar explosão combinatória
+        # Mesmo limite de tempo de uma busca do motor de somas
+        tempo_limite = getattr(self.motor_soma, "tempo_limite", None)
+        prazo = time.perf_counter() + tempo_limite if tempo_limite else None
+        
+        try:
+            for n in range(3, max_itens + 1):
+                posicoes = self._grupo_com_ancora(abs(centavos), valores, alvos, n - 1, prazo)
+                if posicoes is not None:
+                    outros = [itens_mesma_data[p] for p in posicoes]
+                    rel_idx = primeiro_rel[centavos + sum(c for _, c in outros)]
+                    # O item atual será marcado pelo chamador
+                    self._registrar_soma([idx for idx, _ in outros], [rel_idx])
+                    return rel_idx
+        except TimeoutError:
+            if hasattr(self.motor_soma, "buscas_interrompidas"):
+                self.motor_soma.buscas_interrompidas += 1
         
         return None
-    def _registrar_match(self, ofx_item, match):
+
+    @staticmethod
+    def _grupo_com_ancora(ancora, valores, alvos, faltam, prazo=None):
+        """
+        Procura `faltam` posições de `valores` (centavos absolutos, na ordem de entrada)
+        tais que ancora + soma dos valores esteja em `alvos` (lista ordenada).
+        Os grupos são percorridos em ordem lexicográfica das posições e um ramo é
+        abandonado quando nenhum alvo cabe no intervalo que a soma parcial ainda
+        alcança: de soma + menores valores restantes a soma + maiores (bisect).
+        prazo: instante (time.perf_counter) após o qual a busca levanta TimeoutError.
+        Retorna a tupla de posições ou None.
+        """
+        n = len(valores)
+        contador = 0
+        # menores[r][i] / maiores[r][i]: soma dos r menores / maiores valores de valores[i:]
+        # (infinito se não houver r valores). Crescem / decrescem com i, então a poda é um break.
+        infinito = float("inf")
+        menores = [[0] * (n + 1)] + [[infinito] * (n + 1) for _ in range(faltam)]
+        maiores = [[0] * (n + 1)] + [[-infinito] * (n + 1) for _ in range(faltam)]
+        fila_menores, fila_maiores = [], []
+        for i in range(n - 1, -1, -1):
+            insort(fila_menores, valores[i])
+            del fila_menores[faltam:]
+            insort(fila_maiores, -valores[i])
+            del fila_maiores[faltam:]
+            soma_menores = soma_maiores = 0
+            for r in range(1, len(fila_menores) + 1):
+                soma_menores += fila_menores[r - 1]
+                soma_maiores -= fila_maiores[r - 1]
+                menores[r][i] = soma_menores
+                maiores[r][i] = soma_maiores
+
+        def expandir(inicio, faltam, soma):
+            nonlocal contador
+            for i in range(inicio, n):
+                # O intervalo alcançável só encolhe com i: sem alvo nele, nenhum i seguinte serve
+                j = bisect_left(alvos, soma + menores[faltam][i])
+                if j == len(alvos) or alvos[j] > soma + maiores[faltam][i]:
+                    break
+                contador += 1
+                if prazo and contador % 1024 == 0 and time.perf_counter() > prazo:
+                    raise TimeoutError
+                if faltam == 1:
+                    j = bisect_left(alvos, soma + valores[i])
+                    if j < len(alvos) and alvos[j] == soma + valores[i]:
+                        return (i,)
+                    continue
+                resto = expandir(i + 1, faltam - 1, soma + valores[i])
+                if resto is not None:
+                    return (i,) + resto
+            return None
+
+        return expandir(0, faltam, ancora)
+
+    def _registrar_match(self, ofx_idx, ofx_item, match):
         """
         Adiciona as linhas conciliadas (exato ou soma) no resultado final.
         Caso seja soma dupla, a primeira linha fica com 'Conciliado',
         e as demais com 'Conciliado (Soma)'.
         """
         tipo = match[1]
-        itens_rel = match[0] if isinstance(match[0], list) else [match[0]]
+        ids_rel = match[0] if isinstance(match[0], list) else [match[0]]
+        self._remover_ofx(ofx_idx)
         
-        for idx, rel_item in enumerate(itens_rel):
+        for idx, rel_id in enumerate(ids_rel):
             self.resultado.append({
                 "ofx": ofx_item,
-                "rel": rel_item,
+                "rel": self.trans_rel[rel_id],
+                "ofx_id": ofx_idx,
+                "rel_id": rel_id,
                 "status": tipo if idx == 0 else "Conciliado (Soma)"
             })
 
@@ -275,19 +1067,23 @@ class Conciliador:
         Marca como não conciliado tudo que sobrou (tanto no extrato quanto no relatório).
         """
         # Transações do extrato que não tiveram match
-        for ofx_item in self.trans_ofx:
-            if not any(r["ofx"] == ofx_item for r in self.resultado):
+        for ofx_idx, ofx_item in enumerate(self.trans_ofx):
+            if ofx_idx not in self.ofx_conciliados:
                 self.resultado.append({
                     "ofx": ofx_item,
                     "rel": None,
+                    "ofx_id": ofx_idx,
+                    "rel_id": None,
                     "status": "Não conciliado"
                 })
         
         # Transações do relatório que não tiveram match
-        for rel_item in self.nao_conciliadas_rel:
+        for rel_idx, rel_item in self.nao_conciliadas_rel.items():
             self.resultado.append({
                 "ofx": None,
                 "rel": rel_item,
+                "ofx_id": None,
+                "rel_id": rel_idx,
                 "status": "Não conciliado"
             })
 
@@ -303,79 +1099,37 @@ class Conciliador:
             
             linha = {
                 "Extrato Data": ofx["data"].strftime('%d/%m/%Y') if (ofx and pd.notnull(ofx["data"])) else "",
-                "Extrato Valor": f"R$ {ofx['valor']:.2f}".replace('.', ',') if ofx else "",
+                "Extrato Valor": formatar_centavos(self.centavos_ofx[item["ofx_id"]]) if ofx else "",
                 "Extrato Descrição": ofx["descricao"] if ofx else "",
                 "Relatório Data": rel["data"].strftime('%d/%m/%Y') if (rel and pd.notnull(rel["data"])) else "",
-                "Relatório Valor": f"R$ {rel['valor']:.2f}".replace('.', ',') if rel else "",
+                "Relatório Valor": formatar_centavos(self.centavos_rel[item["rel_id"]]) if rel else "",
                 "Relatório Descrição": rel["descricao"] if rel else "",
                 "Status": item["status"]
             }
             linhas.append(linha)
         return pd.DataFrame(linhas)
         
-    def _mostrar_resumo_dias(self):
+    def resumo_dias(self):
         """
-        Exibe um resumo dos dias conciliados e não conciliados
+        Resumo dos dias conciliados e não conciliados (valores em centavos):
+        dias_conciliados, total_dias, total_extrato, total_relatorio,
+        diferenca_total e dias_problema (datas 'dd/mm/aaaa' com diferença).
         """
         # Agrupar transações por dia
         dias_agrupados = self.agrupar_por_dia([])
         
-        # Contar dias conciliados e não conciliados
-        dias_conciliados = sum(1 for row in dias_agrupados if row["tag"] == "match")
-        dias_nao_conciliados = sum(1 for row in dias_agrupados if row["tag"] == "no-match")
-        total_dias = len(dias_agrupados)
-        
-        # Calcular valores totais
-        total_extrato = 0
-        total_relatorio = 0
-        
-        for row in dias_agrupados:
-            # Extrair valores numéricos das strings formatadas
-            valor_extrato_str = row["values"][1].replace("R$", "").replace(".", "").replace(",", ".").strip()
-            valor_relatorio_str = row["values"][4].replace("R$", "").replace(".", "").replace(",", ".").strip()
-            
-            try:
-                total_extrato += float(valor_extrato_str)
-            except ValueError:
-                pass
-                
-            try:
-                total_relatorio += float(valor_relatorio_str)
-            except ValueError:
-                pass
-                
-        diferenca_total = abs(total_extrato - total_relatorio)
-        
-        # Exibir resumo em formato de card
-        st.markdown("### 📆 Resumo por Dias")
-        
-        col1, col2, col3 = st.columns(3)
-        
-        with col1:
-            st.metric(
-                label="Dias Conciliados", 
-                value=f"{dias_conciliados}/{total_dias}",
-                delta=f"{(dias_conciliados/total_dias*100):.1f}%" if total_dias > 0 else "0%"
-            )
-            
-        with col2:
-            st.metric(
-                label="Total Extrato", 
-                value=f"R$ {total_extrato:.2f}".replace('.', ',')
-            )
-            
-        with col3:
-            st.metric(
-                label="Total Relatório", 
-                value=f"R$ {total_relatorio:.2f}".replace('.', ','),
-                delta=f"Diferença: R$ {diferenca_total:.2f}".replace('.', ','),
-                delta_color="inverse" if diferenca_total > 0.01 else "normal"
-            )
+        # Calcular valores totais (em centavos)
+        total_extrato = sum(row["totais"]["extrato"] for row in dias_agrupados)
+        total_relatorio = sum(row["totais"]["relatorio"] for row in dias_agrupados)
         
-        # Listar dias com problemas se houver
-        if dias_nao_conciliados > 0:
-            dias_problema = [row["values"][0] for row in dias_agrupados if row["tag"] == "no-match"]
-            st.warning(f"⚠️ Dias com diferenças: {', '.join(dias_problema)}")
+        return {
+            "dias_conciliados": sum(1 for row in dias_agrupados if row["tag"] == "match"),
+            "total_dias": len(dias_agrupados),
+            "total_extrato": total_extrato,
+            "total_relatorio": total_relatorio,
+            "diferenca_total": abs(total_extrato - total_relatorio),
+            "dias_problema": [row["values"][0] for row in dias_agrupados if row["tag"] == "no-match"],
+        }
     # --------------------------------------------------
     # AGRUPAMENTO POR DIA
     # --------------------------------------------------
@@ -384,12 +1138,14 @@ class Conciliador:
         Agrupa as transações por dia, calculando totais para extrato e relatório.
         - Extrato: soma todos os valores do OFX (exceto saldos)
         - Relatório: soma apenas valores conciliados, respeitando filtros
+        Os totais são somados em centavos inteiros e também devolvidos em
+        row["totais"] para quem precisar dos números sem reinterpretar o texto.
         """
         # Organizar por data
         rows_by_date = {}
         
         # Primeiro, agrupar todas as transações do extrato por data
-        for trans in self.trans_ofx:
+        for ofx_idx, trans in enumerate(self.trans_ofx):
             # Ignorar registros de saldo
             if "descricao" in trans and "saldo" in trans["descricao"].lower():
                 continue
@@ -402,15 +1158,18 @@ class Conciliador:
                     'rows': []
                 }
             # Somar todos os valores do extrato, respeitando o sinal
-            rows_by_date[date_str]['extrato_total'] += trans['valor']
+            rows_by_date[date_str]['extrato_total'] += self.centavos_ofx[ofx_idx]
         
         # Processar as transações do relatório que foram conciliadas
+        rel_somados = set()
         for item in self.resultado:
             rel_item = item['rel']
             status = item['status']
             
-            # Considerar apenas itens conciliados do relatório
-            if rel_item and status in ["Conciliado", "Conciliado (Soma)"]:
+            # Considerar apenas itens conciliados do relatório, uma vez cada
+            # (na soma inversa o mesmo item aparece ligado a vários itens do extrato)
+            if rel_item and status in ["Conciliado", "Conciliado (Soma)", "Conciliado (Liquidação)"] and item['rel_id'] not in rel_somados:
+                rel_somados.add(item['rel_id'])
                 date_str = rel_item['data'].strftime('%d/%m/%Y')
                 
                 if date_str not in rows_by_date:
@@ -421,7 +1180,7 @@ class Conciliador:
                     }
                 
                 # Somar valores do relatório (já filtrados por conta e natureza C/D)
-                rows_by_date[date_str]['relatorio_total'] += rel_item['valor']
+                rows_by_date[date_str]['relatorio_total'] += self.centavos_rel[item['rel_id']]
         
         # Criar linhas agregadas
         aggregated_rows = []
@@ -430,12 +1189,11 @@ class Conciliador:
             relatorio_total = data['relatorio_total']
             
             # Formatar os valores para exibição
-            extrato_valor_fmt = f"R$ {extrato_total:.2f}".replace('.', ',')
-            relatorio_valor_fmt = f"R$ {relatorio_total:.2f}".replace('.', ',')
+            extrato_valor_fmt = formatar_centavos(extrato_total)
+            relatorio_valor_fmt = formatar_centavos(relatorio_total)
             
             # Determinar o status com base na diferença
-            diff = abs(extrato_total - relatorio_total)
-            status = "Conciliado" if diff < 0.01 else "Não conciliado"
+            status = "Conciliado" if extrato_total == relatorio_total else "Não conciliado"
             
             aggregated_row = {
                 "values": [
@@ -447,7 +1205,8 @@ class Conciliador:
                     "",  # Espaço em branco
                     status
                 ],
-                "tag": "match" if status == "Conciliado" else "no-match"
+                "tag": "match" if status == "Conciliado" else "no-match",
+                "totais": {"extrato": extrato_total, "relatorio": relatorio_total}
             }
             aggregated_rows.append(aggregated_row)
         
@@ -538,4 +1297,266 @@ class Conciliador:
         try:
             return datetime.strptime(data_str.strip(), "%d/%m/%Y")
         except:
-            return datetime.now()
\ No newline at end of file
+            return datetime.now()
+
+
+def _conciliar_parte(tarefa):
+    """
+    Executado em um processo do pool: concilia as transações de um dia
+    (apenas a etapa dos matches do mesmo dia) e
+    devolve os matches como (ofx_id, rel_id, status) com IDs locais da parte,
+    junto com o número de buscas de soma interrompidas nesta parte.
+    """
+    trans_ofx, trans_rel, motor_soma, configuracao = tarefa
+    # O motor pode chegar com buscas interrompidas de antes: devolver só as desta parte
+    interrompidas_antes = getattr(motor_soma, "buscas_interrompidas", 0)
+    conciliador = Conciliador(
+        trans_ofx, trans_rel, motor_soma,
+        janela_dias=configuracao["janela_dias"],
+        feriados=[date.fromisoformat(dia) for dia in configuracao["feriados"]],
+        usar_descricoes=configuracao["usar_descricoes"],
+        atribuicao_otima=configuracao["atribuicao_otima"],
+        janela_liquidacao=configuracao["janela_liquidacao"],
+        filtro_liquidacao=configuracao["filtro_liquidacao"],
+        frequencias_descricoes=configuracao.get("frequencias_descricoes")
+    )
+    conciliador._processar_mesmo_dia(ObservadorConciliacao())
+    matches = [(item["ofx_id"], item["rel_id"], item["status"]) for item in conciliador.resultado]
+    return matches, getattr(conciliador.motor_soma, "buscas_interrompidas", 0) - interrompidas_antes
+
+
+# --------------------------------------------------
+# API SEM INTERFACE
+# --------------------------------------------------
+COLUNAS_AGREGADO = ["Período", "Total Extrato", " ", "Data Relatório", "Total Relatório", "  ", "Status"]
+
+
+def montar_agregado(dias):
+    """
+    Monta as linhas agregadas por dia (de Conciliador.agrupar_por_dia) para exibição:
+    dias não conciliados recebem a diferença no status e cada linha recebe a tag
+    usada na coloração. Retorna (DataFrame agregado, linhas com as tags).
+    """
+    for row in dias:
+        if row["values"][6] == "Não conciliado":
+            # Diferença exata em centavos, calculada pelo conciliador
+            diferenca = row["totais"]["extrato"] - row["totais"]["relatorio"]
+            row["values"][6] = f"Não conciliado (Diferença: R$ {centavos_para_reais(diferenca):.2f})"
+            row["tag"] = "nao_conciliado"
+        elif row["values"][6] == "Conciliado":
+            row["tag"] = "conciliado"
+        elif row["values"][6] == "Conciliado (Soma)":
+            row["tag"] = "conciliado_soma"
+    return pd.DataFrame([r["values"] for r in dias], columns=COLUNAS_AGREGADO), dias
+
+
+def movimentacao_diaria(df_relatorio):
+    """
+    Receitas e despesas do relatório somadas por dia (apenas dias com movimentação),
+    a partir do DataFrame padronizado de converter_dataframe_colunar.
+    """
+    if df_relatorio is None or df_relatorio.empty:
+        return pd.DataFrame(columns=['data', 'receita', 'despesa'])
+    df_diario = pd.DataFrame({
+        'data': pd.to_datetime(df_relatorio['data']).dt.normalize(),
+        'receita': df_relatorio['receita'],
+        'despesa': df_relatorio['despesa'],
+    })
+    df_diario = df_diario.groupby('data').agg({'receita': 'sum', 'despesa': 'sum'}).reset_index()
+    # Converter as datas para o formato "dd/mm/aaaa"
+    df_diario['data'] = df_diario['data'].dt.strftime("%d/%m/%Y")
+    return df_diario
+
+
+class ResultadoConciliacao:
+    """
+    Resultado completo de uma conciliação:
+    - detalhes: DataFrame transação a transação (Conciliador.executar)
+    - agregado: DataFrame por dia, com a diferença nos dias não conciliados
+    - linhas_agregado: linhas do agregado com as tags de coloração
+    - diario: receitas/despesas do relatório por dia (vazio sem df_relatorio)
+    - estatisticas: contagens, taxa de sucesso e resumo por dias
+    - resultado: lista de pares (ofx, rel, ofx_id, rel_id, status)
+    - execucao_historico: ID da execução no histórico, se já foi gravado
+      (HistoricoConciliacao.registrar)
+    """
+
+    def __init__(self, detalhes, agregado, linhas_agregado, diario, estatisticas, resultado):
+        self.detalhes = detalhes
+        self.agregado = agregado
+        self.linhas_agregado = linhas_agregado
+        self.diario = diario
+        self.estatisticas = estatisticas
+        self.resultado = resultado
+        self.execucao_historico = None
+
+
+def conciliar(trans_ofx, trans_rel, motor_soma=None, observador=None, df_relatorio=None,
+              processos=None, estado=None, janela_dias=0, feriados=None, usar_descricoes=False,
+              atribuicao_otima=False, janela_liquidacao=0, filtro_liquidacao=None):
+    """
+    Executa a conciliação completa sem depender de interface e devolve um
+    ResultadoConciliacao. df_relatorio (opcional) é o DataFrame padronizado do
+    relatório, usado para a movimentação diária. processos > 1 concilia os dias
+    em paralelo. Com um EstadoIncremental, só os dias novos ou alterados são
+    conciliados e o estado é gravado ao final. janela_dias/feriados: tolerância
+    de datas em dias úteis; usar_descricoes: desempate e sugestões pela
+    descrição; atribuicao_otima: modo de atribuição por fases; janela_liquidacao/
+    filtro_liquidacao: liquidações de recebíveis de dias anteriores (ver Conciliador).
+    """
+    conciliador = Conciliador(trans_ofx, trans_rel, motor_soma, janela_dias, feriados, usar_descricoes,
+                              atribuicao_otima, janela_liquidacao, filtro_liquidacao)
+    detalhes = conciliador.executar(observador, processos, estado)
+    if estado is not None:
+        estado.salvar()
+    agregado, linhas = montar_agregado(conciliador.agrupar_por_dia([]))
+    return ResultadoConciliacao(
+        detalhes=detalhes,
+        agregado=agregado,
+        linhas_agregado=linhas,
+        diario=movimentacao_diaria(df_relatorio),
+        estatisticas=conciliador.estatisticas,
+        resultado=conciliador.resultado,
+    )
+
+
+# --------------------------------------------------
+# LOTE COM VÁRIAS CONTAS
+# --------------------------------------------------
+def _normalizar_conta(texto):
+    """Apenas os dígitos da conta, sem zeros à esquerda ('0012345-6' -> '123456')."""
+    return re.sub(r"\D", "", str(texto)).lstrip("0")
+
+
+def parear_contas(contas_ofx, contas_relatorio, mapa_contas=None):
+    """
+    Associa cada conta de extrato (ACCTID ou identificador do arquivo) a um valor
+    da coluna de conta do relatório.
+    - mapa_contas: {conta do extrato: conta do relatório}, sempre tem prioridade.
+    - Sem mapeamento explícito, compara os dígitos: primeiro igualdade, depois
+      a conta do relatório que contém os dígitos do ACCTID (apenas se for única).
+    Cada conta do relatório vai para no máximo um extrato: contas já mapeadas
+    saem dos candidatos e, se dois extratos chegarem à mesma conta, nenhum fica
+    com ela. Uma conta do relatório mapeada para dois extratos é um erro.
+    Retorna {conta do extrato: conta do relatório ou None}.
+    """
+    mapa_contas = mapa_contas or {}
+    contas_ofx = list(contas_ofx)
+    contas_relatorio = list(contas_relatorio)
+    digitos_rel = {conta: _normalizar_conta(conta) for conta in contas_relatorio}
+    
+    pares = {}
+    for conta_ofx in contas_ofx:
+        if conta_ofx in mapa_contas:
+            conta_rel = mapa_contas[conta_ofx]
+            if conta_rel in pares.values():
+                raise Exception(f"A conta do relatório '{conta_rel}' está mapeada para mais de um extrato")
+            pares[conta_ofx] = conta_rel
+    
+    livres = [c for c in contas_relatorio if c not in pares.values()]
+    escolhas = {}
+    for conta_ofx in contas_ofx:
+        if conta_ofx in pares:
+            continue
+        digitos = _normalizar_conta(conta_ofx)
+        if not digitos:
+            escolhas[conta_ofx] = None
+            continue
+        iguais = [c for c in livres if digitos_rel[c] == digitos]
+        if not iguais:
+            iguais = [c for c in livres if digitos_rel[c] and digitos in digitos_rel[c]]
+        escolhas[conta_ofx] = iguais[0] if len(iguais) == 1 else None
+    
+    # Pareamento ambíguo: a mesma conta do relatório para mais de um extrato
+    disputadas = Counter(c for c in escolhas.values() if c is not None)
+    for conta_ofx, conta_rel in escolhas.items():
+        pares[conta_ofx] = conta_rel if conta_rel is not None and disputadas[conta_rel] == 1 else None
+    return {conta: pares[conta] for conta in contas_ofx}
+
+
+def caminho_estado(pasta, *identificadores):
+    """Arquivo de estado incremental para uma conta (identificadores viram o nome do arquivo)."""
+    nome = "_".join(re.sub(r"[^\w.-]+", "-", str(i)).strip("-") or "padrao" for i in identificadores)
+    return os.path.join(pasta, f"{nome}.json")
+
+
+class ResultadoLote:
+    """
+    Resultado da conciliação de várias contas em uma única execução:
+    - por_conta: {conta do extrato: ResultadoConciliacao}
+    - pares: {conta do extrato: conta do relatório ou None}
+    - detalhes / agregado / diario: DataFrames consolidados, com a coluna "Conta"
+    - estatisticas: {conta do extrato: estatísticas da conta}
+    - extratos_sem_conta: extratos sem conta correspondente no relatório
+    - contas_sem_extrato: contas do relatório sem extrato (não conciliadas)
+    """
+
+    def __init__(self, por_conta, pares, extratos_sem_conta, contas_sem_extrato):
+        self.por_conta = por_conta
+        self.pares = pares
+        self.extratos_sem_conta = extratos_sem_conta
+        self.contas_sem_extrato = contas_sem_extrato
+        self.detalhes = self._consolidar("detalhes")
+        self.agregado = self._consolidar("agregado")
+        self.diario = self._consolidar("diario")
+        self.estatisticas = {conta: r.estatisticas for conta, r in por_conta.items()}
+
+    def _consolidar(self, atributo):
+        partes = []
+        for conta, resultado in self.por_conta.items():
+            df = getattr(resultado, atributo)
+            if not df.empty:
+                partes.append(df.assign(Conta=conta)[["Conta"] + list(df.columns)])
+        return pd.concat(partes, ignore_index=True) if partes else pd.DataFrame(columns=["Conta"])
+
+
+def _conciliar_conta(tarefa):
+    """Executado em um processo do pool: concilia uma conta inteira."""
+    trans_ofx, df_parte, motor_soma, caminho_estado, opcoes = tarefa
+    estado = EstadoIncremental(caminho_estado, motor_soma) if caminho_estado else None
+    return conciliar(trans_ofx, criar_transacoes(df_parte), motor_soma, df_relatorio=df_parte,
+                     estado=estado, **opcoes)
+
+
+def conciliar_contas(extratos, df_relatorio, mapa_contas=None, motor_soma=None, processos=None,
+                     pasta_estado=None, janela_dias=0, feriados=None, usar_descricoes=False,
+                     atribuicao_otima=False, janela_liquidacao=0, filtro_liquidacao=None):
+    """
+    Concilia várias contas de uma vez a partir de um único relatório já convertido
+    (DataFrame de converter_dataframe_colunar, sem filtro de conta).
+    extratos: {conta do extrato (ACCTID): lista de transações do OFX}.
+    O relatório é dividido pela coluna 'conta' e cada parte é pareada com o seu
+    extrato (parear_contas). Com processos > 1 as contas rodam em paralelo.
+    pasta_estado: ativa o modo incremental, com um estado por conta nesta pasta.
+    janela_dias/feriados/usar_descricoes/atribuicao_otima/janela_liquidacao/
+    filtro_liquidacao: opções do Conciliador.
+    Retorna um ResultadoLote.
+    """
+    partes_rel = dict(tuple(df_relatorio.groupby('conta', sort=False))) if not df_relatorio.empty else {}
+    pares = parear_contas(extratos.keys(), partes_rel.keys(), mapa_contas)
+    
+    contas = [conta for conta in extratos if pares[conta] is not None]
+    vazio = df_relatorio.iloc[0:0]
+    tarefas = [
+        (extratos[conta], partes_rel.get(pares[conta], vazio).reset_index(drop=True),
+         copy.deepcopy(motor_soma) if motor_soma is not None else None,
+         caminho_estado(pasta_estado, conta) if pasta_estado else None,
+         {"janela_dias": janela_dias, "feriados": feriados, "usar_descricoes": usar_descricoes,
+          "atribuicao_otima": atribuicao_otima, "janela_liquidacao": janela_liquidacao,
+          "filtro_liquidacao": filtro_liquidacao})
+        for conta in contas
+    ]
+    
+    if processos and processos > 1 and len(tarefas) > 1:
+        with ProcessPoolExecutor(max_workers=processos) as executor:
+            resultados = list(executor.map(_conciliar_conta, tarefas))
+    else:
+        resultados = [_conciliar_conta(tarefa) for tarefa in tarefas]
+    
+    pareadas = {pares[conta] for conta in contas}
+    return ResultadoLote(
+        por_conta=dict(zip(contas, resultados)),
+        pares=pares,
+        extratos_sem_conta=[conta for conta in extratos if pares[conta] is None],
+        contas_sem_extrato=[conta for conta in partes_rel if conta not in pareadas],
+    )
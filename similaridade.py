@@ -0,0 +1,116 @@
+import re
+import math
+import unicodedata
+from functools import lru_cache
+
+# Palavras sem valor para identificar uma transação
+PALAVRAS_IGNORADAS = {"dos", "das", "para", "com", "por", "pelo", "pela", "ltda", "eireli", "the"}
+
+# Tokens presentes em mais que esta fração dos itens (e em mais de 50 itens) não geram
+# candidatos: "pix", "pagamento", "ted" aparecem em quase tudo e só custariam tempo
+FRACAO_TOKEN_COMUM = 0.05
+
+
+def normalizar(texto):
+    """Texto sem acentos e em minúsculas (ex.: 'Cartão CIELO' -> 'cartao cielo')."""
+    texto = unicodedata.normalize("NFKD", str(texto or ""))
+    return "".join(c for c in texto if not unicodedata.combining(c)).lower()
+
+
+@lru_cache(maxsize=65536)
+def tokenizar(texto):
+    """
+    Normaliza uma descrição (normalizar) e retorna o conjunto de tokens
+    alfanuméricos com 3 ou mais caracteres, fora as palavras ignoradas.
+    """
+    if not texto:
+        return frozenset()
+    return frozenset(
+        token for token in re.findall(r"[a-z0-9]+", normalizar(texto))
+        if len(token) >= 3 and token not in PALAVRAS_IGNORADAS
+    )
+
+
+class IndiceDescricoes:
+    """
+    Índice invertido (token -> grupo -> itens) sobre as descrições do relatório,
+    com peso IDF por token. A similaridade é o cosseno entre os conjuntos de tokens
+    ponderados, e só são pontuados os itens que têm algum token em comum com a
+    descrição procurada, sem comparar todos os pares. O grupo (ex.: a data do
+    lançamento) permite pontuar só os itens de alguns grupos, sem percorrer as
+    listas do relatório inteiro.
+    """
+
+    def __init__(self, itens, frequencias=None):
+        """
+        itens: iterável de (id, descrição, grupo).
+        frequencias: (total de itens, {token: itens com o token}) de um índice maior,
+            usadas nos pesos IDF no lugar das contagens destes itens. Assim um índice
+            com parte do relatório (um dia) pontua igual ao do relatório inteiro.
+        """
+        self._tokens = {}
+        self._postings = {}
+        for idx, descricao, grupo in itens:
+            tokens = tokenizar(descricao)
+            self._tokens[idx] = tokens
+            for token in tokens:
+                self._postings.setdefault(token, {}).setdefault(grupo, []).append(idx)
+
+        if frequencias is None:
+            frequencias = (len(self._tokens), {
+                token: sum(len(ids) for ids in grupos.values()) for token, grupos in self._postings.items()
+            })
+        self.frequencias = frequencias
+        total, self._df = frequencias
+        total = max(total, 1)
+        self._idf = {token: math.log(1 + total / self._df.get(token, 1)) for token in self._postings}
+        self._normas = {
+            idx: math.sqrt(sum(self._idf[token] ** 2 for token in tokens))
+            for idx, tokens in self._tokens.items()
+        }
+        self._limite_comum = max(50, int(total * FRACAO_TOKEN_COMUM))
+
+    def _pesos(self, texto):
+        """Tokens da descrição procurada com o peso IDF (tokens desconhecidos são ignorados)."""
+        return {token: self._idf[token] for token in tokenizar(texto) if token in self._idf}
+
+    def similaridade(self, texto, idx):
+        """Similaridade (0 a 1) entre a descrição e o item idx do índice."""
+        pesos = self._pesos(texto)
+        norma_item = self._normas.get(idx)
+        if not pesos or not norma_item:
+            return 0.0
+        comum = sum(pesos[token] ** 2 for token in self._tokens[idx] if token in pesos)
+        return comum / (math.sqrt(sum(p ** 2 for p in pesos.values())) * norma_item)
+
+    def candidatos(self, texto, limiar=0.0, grupos=None):
+        """
+        Itens com pelo menos um token em comum (exceto os muito comuns), em ordem
+        decrescente de similaridade: lista de (similaridade, id).
+        grupos: se informado, só os itens destes grupos são pontuados.
+        """
+        pesos = self._pesos(texto)
+        if not pesos:
+            return []
+        norma = math.sqrt(sum(p ** 2 for p in pesos.values()))
+
+        comuns = {}
+        for token, peso in pesos.items():
+            if self._df.get(token, 0) > self._limite_comum:
+                continue
+            por_grupo = self._postings[token]
+            listas = por_grupo.values() if grupos is None else (por_grupo.get(g, ()) for g in grupos)
+            for ids in listas:
+                for idx in ids:
+                    comuns[idx] = comuns.get(idx, 0.0) + peso ** 2
+
+        pontuados = []
+        for idx, comum in comuns.items():
+            # Tokens comuns não geram candidatos, mas contam na pontuação
+            comum += sum(pesos[t] ** 2 for t in self._tokens[idx]
+                         if t in pesos and self._df.get(t, 0) > self._limite_comum)
+            similaridade = comum / (norma * self._normas[idx])
+            if similaridade >= limiar:
+                pontuados.append((similaridade, idx))
+        pontuados.sort(key=lambda par: (-par[0], par[1]))
+        return pontuados
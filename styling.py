@@ -5,12 +5,16 @@ def colorir_linhas(df):
     Aplica cores às linhas do DataFrame com base no status de conciliação.
     - Verde: Conciliado
     - Amarelo: Conciliado (Soma)
+    - Azul: Conciliado (Liquidação)
+    - Laranja: Sugerido (Descrição)
     - Vermelho: Não conciliado
     """
     return df.style.apply(
         lambda row: [
             'background-color: #c8e6c9' if row['Status'] == 'Conciliado' else
             'background-color: #fff9c4' if row['Status'] == 'Conciliado (Soma)' else
+            'background-color: #bbdefb' if row['Status'] == 'Conciliado (Liquidação)' else
+            'background-color: #ffe0b2' if row['Status'] == 'Sugerido (Descrição)' else
             'background-color: #ffcdd2' if 'Não conciliado' in str(row['Status']) else
             ''
             for _ in row
@@ -0,0 +1,100 @@
+import pandas as pd
+
+
+class Transacao:
+    """
+    Registro compacto de uma transação (extrato ou relatório).
+
+    Usa __slots__ em vez de um dicionário por linha, o que reduz bastante a memória
+    em arquivos grandes. Continua acessível como dicionário (t["data"], t.get("conta"),
+    "descricao" in t) para o código que trata transações dessa forma. A igualdade é
+    por identidade: duas linhas idênticas do arquivo continuam sendo transações distintas.
+    """
+
+    __slots__ = ('id', 'data', 'valor', 'centavos', 'descricao', 'conta', 'receita', 'despesa', 'fitid')
+
+    def __init__(self, data, valor, centavos, descricao='', conta='', receita=0.0, despesa=0.0,
+                 fitid='', id=None):
+        self.id = id
+        self.data = data
+        self.valor = valor
+        self.centavos = centavos
+        self.descricao = descricao
+        self.conta = conta
+        self.receita = receita
+        self.despesa = despesa
+        self.fitid = fitid
+
+    def __getitem__(self, campo):
+        try:
+            return getattr(self, campo)
+        except (AttributeError, TypeError):
+            raise KeyError(campo)
+
+    def __setitem__(self, campo, valor):
+        if campo not in self.__slots__:
+            raise KeyError(campo)
+        setattr(self, campo, valor)
+
+    def __contains__(self, campo):
+        return campo in self.__slots__
+
+    def get(self, campo, padrao=None):
+        return getattr(self, campo, padrao) if campo in self.__slots__ else padrao
+
+    def keys(self):
+        return self.__slots__
+
+    def para_dict(self):
+        """Retorna a transação como dicionário (para exportação e DataFrames)."""
+        return {campo: getattr(self, campo) for campo in self.__slots__}
+
+    def __repr__(self):
+        return f"Transacao({self.para_dict()!r})"
+
+    def __getstate__(self):
+        return tuple(getattr(self, campo) for campo in self.__slots__)
+
+    def __setstate__(self, estado):
+        for campo, valor in zip(self.__slots__, estado):
+            setattr(self, campo, valor)
+
+
+def criar_transacoes(df):
+    """
+    Cria a lista de Transacao a partir do DataFrame padronizado de
+    converter_dataframe_colunar, numerando os IDs pela posição.
+    Datas, contas e descrições repetidas compartilham o mesmo objeto Python.
+    """
+    if df.empty:
+        return []
+
+    # Uma única instância de datetime por data distinta
+    codigos, datas_distintas = pd.factorize(df['data'])
+    datas_distintas = list(pd.DatetimeIndex(datas_distintas).to_pydatetime())
+    datas = [datas_distintas[c] if c >= 0 else None for c in codigos]
+
+    # Contas e históricos se repetem muito em exportações de ERP: compartilhar as strings
+    distintos = {}
+    contas = [distintos.setdefault(c, c) for c in df['conta'].tolist()]
+    descricoes = [distintos.setdefault(d, d) for d in df['descricao'].tolist()]
+
+    return [
+        Transacao(data, valor, centavos, descricao, conta, receita, despesa, id=pos)
+        for pos, (data, valor, centavos, descricao, conta, receita, despesa) in enumerate(zip(
+            datas,
+            df['valor'].tolist(),
+            df['centavos'].tolist(),
+            descricoes,
+            contas,
+            df['receita'].tolist(),
+            df['despesa'].tolist(),
+        ))
+    ]
+
+
+def transacoes_para_dataframe(transacoes):
+    """Monta um DataFrame (uma coluna por campo) a partir de uma lista de Transacao."""
+    return pd.DataFrame(
+        {campo: [getattr(t, campo) for t in transacoes] for campo in Transacao.__slots__}
+    )